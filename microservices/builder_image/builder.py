@@ -2,67 +2,344 @@ import pyspark.sql
 from pyspark.sql import SparkSession
 import time
 import numpy as np  # Don't remove, the pyparsk uses the lib.
-from pyspark.ml.evaluation import MulticlassClassificationEvaluator
+from pyspark.ml.evaluation import (
+    MulticlassClassificationEvaluator,
+    RegressionEvaluator,
+)
+from pyspark.ml.tuning import (
+    ParamGridBuilder,
+    CrossValidator,
+    TrainValidationSplit,
+)
+from pyspark.ml import PipelineModel
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from collections import OrderedDict
+from threading import Lock
+from uuid import uuid4
+import hashlib
+import json
+import math
+import os
+import shutil
+import traceback
 from utils import Metadata, Database
+from instrumentation import Instrumentation
+from sizing import SizingPolicy
+from estimator import EstimatorCatalog
 from pyspark.sql import dataframe
-from pyspark.ml.classification import (
-    LogisticRegression,
-    DecisionTreeClassifier,
-    RandomForestClassifier,
-    GBTClassifier,
-    NaiveBayes,
+from pyspark.sql import functions, Column
+from pyspark.sql.types import (
+    StructType,
+    StructField,
+    LongType,
+    IntegerType,
+    DoubleType,
+    ArrayType,
 )
+from pyspark import StorageLevel
+from py4j.protocol import Py4JError
+
+
+class ModelCache:
+    DEFAULT_CAPACITY = 8
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.__capacity = capacity
+        self.__models = OrderedDict()
+        self.__lock = Lock()
+
+    def load(self, model_path: str) -> PipelineModel:
+        with self.__lock:
+            if model_path in self.__models:
+                self.__models.move_to_end(model_path)
+                return self.__models[model_path]
+
+        model = PipelineModel.load(model_path)
+
+        with self.__lock:
+            self.__models[model_path] = model
+            self.__models.move_to_end(model_path)
+            while len(self.__models) > self.__capacity:
+                self.__models.popitem(last=False)
+
+        return model
+
+    def invalidate(self, model_path: str) -> None:
+        with self.__lock:
+            self.__models.pop(model_path, None)
+
+
+class FeatureCache:
+    DEFAULT_DISK_BUDGET = 10 * 1024 ** 3
+    FEATURES_NAMES = ["training", "testing", "evaluation"]
+    __MANIFEST_FILENAME = "manifest.json"
+    __TEMPORARY_PREFIX = "."
+
+    def __init__(self, cache_path: str,
+                 disk_budget: int = DEFAULT_DISK_BUDGET):
+        self.__cache_path = cache_path
+        self.__disk_budget = disk_budget
+        self.__lock = Lock()
+
+    @staticmethod
+    def fingerprint(modeling_code: str, datasets_version: list) -> str:
+        fingerprint_source = json.dumps([modeling_code, datasets_version],
+                                        sort_keys=True, default=str)
+        return hashlib.sha256(fingerprint_source.encode("utf-8")).hexdigest()
+
+    def read(self, spark_session: SparkSession, fingerprint: str) -> dict:
+        entry_path = os.path.join(self.__cache_path, fingerprint)
+        manifest_path = os.path.join(entry_path, self.__MANIFEST_FILENAME)
+
+        with self.__lock:
+            if not os.path.exists(manifest_path):
+                return None
+            os.utime(manifest_path)
+            with open(manifest_path) as manifest_file:
+                stored_features = json.load(manifest_file)
+
+        return {
+            features_name:
+                spark_session.read.parquet(
+                    os.path.join(entry_path, features_name))
+                if features_name in stored_features else None
+            for features_name in self.FEATURES_NAMES
+        }
+
+    def write(self, fingerprint: str, features: dict) -> None:
+        temporary_path = os.path.join(
+            self.__cache_path,
+            f'{self.__TEMPORARY_PREFIX}{fingerprint}.{uuid4().hex}')
+
+        stored_features = []
+        try:
+            for features_name, features_dataframe in features.items():
+                if features_dataframe is not None:
+                    features_dataframe.write.parquet(
+                        os.path.join(temporary_path, features_name))
+                    stored_features.append(features_name)
+
+            with open(os.path.join(temporary_path,
+                                   self.__MANIFEST_FILENAME),
+                      "w") as manifest_file:
+                json.dump(stored_features, manifest_file)
+        except Exception:
+            shutil.rmtree(temporary_path, ignore_errors=True)
+            raise
+
+        with self.__lock:
+            entry_path = os.path.join(self.__cache_path, fingerprint)
+            if os.path.exists(entry_path):
+                shutil.rmtree(temporary_path, ignore_errors=True)
+            else:
+                os.rename(temporary_path, entry_path)
+
+            self.__evict(fingerprint)
+
+    def __evict(self, kept_fingerprint: str) -> None:
+        entries = []
+        for fingerprint in os.listdir(self.__cache_path):
+            entry_path = os.path.join(self.__cache_path, fingerprint)
+            manifest_path = os.path.join(entry_path,
+                                         self.__MANIFEST_FILENAME)
+            if fingerprint.startswith(self.__TEMPORARY_PREFIX) or \
+                    not os.path.exists(manifest_path):
+                continue
+
+            entries.append((os.path.getmtime(manifest_path),
+                            self.__directory_size(entry_path),
+                            fingerprint))
+
+        total_size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, fingerprint in sorted(entries):
+            if total_size <= self.__disk_budget:
+                break
+            if fingerprint == kept_fingerprint:
+                continue
+
+            shutil.rmtree(os.path.join(self.__cache_path, fingerprint),
+                          ignore_errors=True)
+            total_size -= entry_size
+
+    @staticmethod
+    def __directory_size(directory_path: str) -> int:
+        return sum(
+            os.path.getsize(os.path.join(root, filename))
+            for root, _, filenames in os.walk(directory_path)
+            for filename in filenames
+        )
 
 
 class Builder:
     METADATA_DOCUMENT_ID = 0
     DOCUMENT_ID_NAME = "_id"
+    DEFAULT_STORAGE_LEVEL = "MEMORY_AND_DISK"
+    MONGO_SPARK_SOURCE = "com.mongodb.spark.sql.DefaultSource"
+    AUC_SCORE_BUCKETS = 1000
+    CROSS_VALIDATION = "crossValidation"
+    TRAIN_VALIDATION_SPLIT = "trainValidationSplit"
+    DEFAULT_TUNING_METHOD = CROSS_VALIDATION
+    DEFAULT_TUNING_PARALLELISM = 1
+    TUNING_NUM_FOLDS = 3
+    TUNING_TRAIN_RATIO = 0.75
+    RACING_ETA = 2
+    RACING_VALIDATION_RATIO = 0.2
+    RACING_SEED = 0
+    CLASSIFICATION_SCORE = "weightedF1"
+    REGRESSION_SCORE = "r2"
+    VECTOR_SCHEMA = StructType([
+        StructField("type", IntegerType()),
+        StructField("size", IntegerType()),
+        StructField("indices", ArrayType(IntegerType())),
+        StructField("values", ArrayType(DoubleType())),
+    ])
 
     def __init__(self, database_connector: Database,
                  metadata_creator: Metadata,
-                 spark_session: pyspark.sql.SparkSession):
+                 spark_session: pyspark.sql.SparkSession,
+                 models_path: str, model_cache: ModelCache,
+                 feature_cache: FeatureCache):
         self.__database = database_connector
         self.__metadata_creator = metadata_creator
         self.__thread_pool = ThreadPoolExecutor()
         self.__spark_session = spark_session
-
-    def build(self, modeling_code: str, classifiers_list: list,
+        self.__models_path = models_path
+        self.__model_cache = model_cache
+        self.__feature_cache = feature_cache
+        self.__instrumentation = Instrumentation(
+            spark_session.sparkContext)
+        self.__sizing_policy = SizingPolicy(spark_session.sparkContext,
+                                            "builder/sparkml")
+
+    def build(self, modeling_code: str, classifiers_specification: dict,
               train_filename: str, test_filename: str,
-              database_url_training: str, dataset_url_test: str) -> None:
+              database_url_training: str, dataset_url_test: str,
+              prediction_urls: dict,
+              storage_level: str = DEFAULT_STORAGE_LEVEL,
+              tuning: dict = None, time_budget: float = None) -> None:
         classifiers_metadata = {}
+        spark_sizing = self.__spark_sizing(train_filename, test_filename)
 
-        for classifier_name in classifiers_list:
+        for classifier_name, specification in \
+                classifiers_specification.items():
             classifiers_metadata[classifier_name] = \
                 self.__metadata_creator.create_file(classifier_name,
                                                     train_filename,
                                                     test_filename)
+            classifiers_metadata[classifier_name]["estimator"] = \
+                specification
+            classifiers_metadata[classifier_name]["modelingCode"] = \
+                modeling_code
+            classifiers_metadata[classifier_name]["sparkSizing"] = \
+                spark_sizing
+
+        features_fingerprint = FeatureCache.fingerprint(
+            modeling_code,
+            [self.__database.dataset_version(train_filename),
+             self.__database.dataset_version(test_filename)])
 
         self.__thread_pool.submit(self.__pipeline, modeling_code,
                                   classifiers_metadata,
-                                  database_url_training, dataset_url_test)
+                                  database_url_training, dataset_url_test,
+                                  prediction_urls, storage_level,
+                                  tuning or {}, features_fingerprint,
+                                  spark_sizing, time_budget)
+
+    def predict(self, model_metadata: dict, test_filename: str,
+                database_url_training: str, database_url_test: str,
+                prediction_url: str) -> None:
+        train_filename = model_metadata["parentDatasetName"][0]
+        prediction_metadata = self.__metadata_creator.create_file(
+            model_metadata["classifier"],
+            train_filename,
+            test_filename)
+        prediction_metadata["model"] = model_metadata["datasetName"]
+        prediction_metadata["sparkSizing"] = self.__spark_sizing(
+            train_filename, test_filename)
+
+        features_fingerprint = FeatureCache.fingerprint(
+            model_metadata["modelingCode"],
+            [self.__database.dataset_version(train_filename),
+             self.__database.dataset_version(test_filename)])
+
+        self.__thread_pool.submit(self.__prediction_pipeline,
+                                  model_metadata, prediction_metadata,
+                                  database_url_training, database_url_test,
+                                  prediction_url, features_fingerprint)
+
+    def __prediction_pipeline(self, model_metadata: dict,
+                              prediction_metadata: dict,
+                              database_url_training: str,
+                              database_url_test: str,
+                              prediction_url: str,
+                              features_fingerprint: str) -> None:
+        with self.__instrumentation.job(
+                prediction_metadata["datasetName"],
+                "builder/sparkml prediction",
+                self.__sizing_policy.local_properties(
+                    prediction_metadata["sparkSizing"])):
+            model = self.__model_cache.load(model_metadata["modelPath"])
+
+            features, features_cache_hit = self.__staged_features(
+                model_metadata["modelingCode"],
+                features_fingerprint,
+                database_url_training,
+                database_url_test)
+            prediction_metadata["featuresFingerprint"] = features_fingerprint
+            prediction_metadata["featuresCacheHit"] = features_cache_hit
 
-    def __pipeline(self, modeling_code: str, classifiers_metadata: dict,
-                   database_url_training: str, database_url_test: str) -> None:
+            testing_prediction = model.transform(features["testing"])
+            prediction_metadata["sparkSizing"] = \
+                self.__sizing_policy.observed(
+                    prediction_metadata["sparkSizing"])
 
-        (features_training, features_testing, features_evaluation) = \
-            self.__modeling_code_processing(
+        self.__save_classifier_result(testing_prediction,
+                                      prediction_metadata,
+                                      prediction_url,
+                                      "builder/sparkml prediction")
+
+    def __pipeline(self, modeling_code: str, classifiers_metadata: dict,
+                   database_url_training: str, database_url_test: str,
+                   prediction_urls: dict, storage_level: str,
+                   tuning: dict, features_fingerprint: str,
+                   spark_sizing: dict, time_budget: float) -> None:
+        features_job_group = f'features.{uuid4().hex}'
+        with self.__instrumentation.job(
+                features_job_group, "builder/sparkml features",
+                self.__sizing_policy.local_properties(spark_sizing)):
+            features, features_cache_hit = self.__staged_features(
                 modeling_code,
-                self.__spark_session,
+                features_fingerprint,
                 database_url_training,
                 database_url_test)
-
-        classifier_switcher = {
-            "LR": LogisticRegression(),
-            "DT": DecisionTreeClassifier(),
-            "RF": RandomForestClassifier(),
-            "GB": GBTClassifier(),
-            "NB": NaiveBayes(),
+            start_cache_time = time.time()
+            self.__persist_features(features, storage_level)
+            cache_time = time.time() - start_cache_time
+            if not features_cache_hit:
+                self.__cache_features(features_fingerprint, features)
+        features_training = features["training"]
+        features_testing = features["testing"]
+        features_evaluation = features["evaluation"]
+        features_spark_summary = Instrumentation.summary(
+            self.__instrumentation.stages(features_job_group))
+
+        estimators = {
+            name: EstimatorCatalog.instantiate(metadata["estimator"])
+            for name, metadata in classifiers_metadata.items()
         }
         classifier_threads = []
 
-        for name, metadata in classifiers_metadata.items():
-            classifier = classifier_switcher[name]
+        if time_budget is not None and len(classifiers_metadata) > 1:
+            surviving_names = self.__race_classifiers(
+                estimators, classifiers_metadata,
+                features_training, time_budget, tuning)
+        else:
+            surviving_names = list(classifiers_metadata)
+
+        for name in surviving_names:
+            metadata = classifiers_metadata[name]
+            classifier = estimators[name]
             classifier_threads.append(
                 self.__thread_pool.submit(
                     self.__classifier_processing,
@@ -71,16 +348,280 @@ class Builder:
                     features_testing,
                     features_evaluation,
                     metadata,
+                    tuning.get("paramGrid", {}).get(name),
+                    tuning,
                 )
             )
 
-        for classifier in classifier_threads:
-            testing_prediction, metadata_document = classifier.result()
+        classifier_results = [classifier.result()
+                              for classifier in classifier_threads]
+        features_cache = self.__features_cache_report(features)
+
+        for metadata_document in classifiers_metadata.values():
+            metadata_document["featuresStorageLevel"] = storage_level
+            metadata_document["featuresCacheTime"] = cache_time
+            metadata_document["featuresCache"] = features_cache
+            metadata_document["featuresFingerprint"] = features_fingerprint
+            metadata_document["featuresCacheHit"] = features_cache_hit
+            metadata_document["featuresSparkSummary"] = \
+                features_spark_summary
+
+        for name, metadata_document in classifiers_metadata.items():
+            if name not in surviving_names:
+                self.__save_pruned_classifier(metadata_document)
+
+        for testing_prediction, metadata_document in classifier_results:
             self.__save_classifier_result(
                 testing_prediction,
-                metadata_document
+                metadata_document,
+                prediction_urls[metadata_document["classifier"]],
+                "builder/sparkml classifier"
             )
 
+        self.__unpersist_features(features)
+
+    def __spark_sizing(self, train_filename: str,
+                       test_filename: str) -> dict:
+        input_size = sum(
+            self.__database.collection_statistics(filename)["size"]
+            for filename in {train_filename, test_filename})
+
+        return self.__sizing_policy.size(input_size)
+
+    def __race_classifiers(self, classifiers: dict,
+                           classifiers_metadata: dict,
+                           features_training: dataframe,
+                           time_budget: float, tuning: dict) -> list:
+        start_racing_time = time.time()
+        racing_training, racing_validation = features_training.randomSplit(
+            [1 - self.RACING_VALIDATION_RATIO, self.RACING_VALIDATION_RATIO],
+            seed=self.RACING_SEED)
+
+        rounds_number = math.ceil(
+            math.log(len(classifiers_metadata), self.RACING_ETA))
+        fractions = [self.RACING_ETA ** (round_index - rounds_number)
+                     for round_index in range(rounds_number)]
+
+        racing_documents = {
+            name: {
+                "timeBudget": time_budget,
+                "rounds": [],
+                "pruned": False,
+                "prunedReason": None,
+            }
+            for name in classifiers_metadata
+        }
+        for name, metadata_document in classifiers_metadata.items():
+            metadata_document["racing"] = racing_documents[name]
+
+        def prune(name: str, reason: str) -> None:
+            racing_documents[name]["pruned"] = True
+            racing_documents[name]["prunedReason"] = reason
+
+        survivors = list(classifiers_metadata)
+        for round_index, fraction in enumerate(fractions):
+            round_threads = {
+                name: self.__thread_pool.submit(
+                    self.__racing_round,
+                    classifiers[name],
+                    racing_training,
+                    racing_validation,
+                    fraction,
+                    classifiers_metadata[name])
+                for name in survivors
+            }
+            for name, round_thread in round_threads.items():
+                racing_documents[name]["rounds"].append(round_thread.result())
+
+            ranking = sorted(
+                survivors,
+                key=lambda name: racing_documents[name]["rounds"][-1]["score"],
+                reverse=True)
+            survivors_number = math.ceil(len(ranking) / self.RACING_ETA)
+            for position, name in enumerate(ranking):
+                if position >= survivors_number:
+                    last_round = racing_documents[name]["rounds"][-1]
+                    prune(name,
+                          f'ranked {position + 1} of {len(ranking)} with '
+                          f'{last_round["metricName"]} '
+                          f'{last_round["score"]:.4f} on a {fraction} sample')
+            survivors = ranking[:survivors_number]
+
+            sample_fit_times = {
+                name: racing_documents[name]["rounds"][-1]["fitTime"] /
+                fraction
+                for name in survivors
+            }
+            full_fit_times = {
+                name: sample_fit_times[name] * self.__tuning_fits(
+                    tuning.get("paramGrid", {}).get(name), tuning)
+                for name in survivors
+            }
+            remaining_budget = time_budget - (time.time() - start_racing_time)
+            projected_time = sum(full_fit_times.values()) + \
+                sum(sample_fit_times.values()) * \
+                sum(fractions[round_index + 1:])
+            if projected_time <= remaining_budget:
+                continue
+
+            affordable_survivors = survivors[:1]
+            for name in survivors[1:]:
+                if sum(full_fit_times[survivor] for survivor in
+                       affordable_survivors + [name]) > remaining_budget:
+                    break
+                affordable_survivors.append(name)
+
+            for name in survivors[len(affordable_survivors):]:
+                prune(name,
+                      f'projected full fit of {full_fit_times[name]:.1f}s '
+                      f'exceeds the remaining time budget of '
+                      f'{remaining_budget:.1f}s')
+            survivors = affordable_survivors
+            break
+
+        return survivors
+
+    def __tuning_fits(self, param_grid: dict, tuning: dict) -> int:
+        if not param_grid:
+            return 1
+
+        combinations = 1
+        for param_values in param_grid.values():
+            combinations *= len(param_values)
+
+        tuning_method = tuning.get("tuningMethod",
+                                   self.DEFAULT_TUNING_METHOD)
+        if tuning_method == self.TRAIN_VALIDATION_SPLIT:
+            return combinations * 2
+
+        return combinations * (self.TUNING_NUM_FOLDS + 1)
+
+    def __racing_round(self, classifier: object,
+                       racing_training: dataframe,
+                       racing_validation: dataframe, fraction: float,
+                       metadata_document: dict) -> dict:
+        classifier.featuresCol = "features"
+
+        with self.__instrumentation.job(
+                metadata_document["datasetName"], "builder/sparkml racing",
+                self.__sizing_policy.local_properties(
+                    metadata_document["sparkSizing"])):
+            start_fit_time = time.time()
+            model = classifier.fit(racing_training.sample(
+                fraction=fraction, seed=self.RACING_SEED))
+            fit_time = time.time() - start_fit_time
+
+            metrics = self.__metrics(metadata_document, model,
+                                     model.transform(racing_validation))
+            metadata_document["sparkSizing"] = self.__sizing_policy.observed(
+                metadata_document["sparkSizing"])
+        score_name = self.__score_name(metadata_document)
+
+        return {
+            "fraction": fraction,
+            "metricName": score_name,
+            "score": metrics.get(score_name) or 0.0,
+            "fitTime": fit_time,
+        }
+
+    def __save_pruned_classifier(self, metadata_document: dict) -> None:
+        self.__database.update_one(
+            metadata_document["datasetName"],
+            metadata_document,
+            {self.DOCUMENT_ID_NAME: self.METADATA_DOCUMENT_ID})
+
+        spark_stages = self.__instrumentation.stages(
+            metadata_document["datasetName"])
+        self.__metadata_creator.update_spark_statistics(
+            metadata_document["datasetName"], spark_stages,
+            Instrumentation.summary(spark_stages))
+
+        self.__metadata_creator.update_finished_flag(
+            metadata_document["datasetName"], True)
+
+    def __staged_features(self, modeling_code: str,
+                          features_fingerprint: str,
+                          database_url_training: str,
+                          database_url_test: str) -> (dict, bool):
+        features = self.__feature_cache.read(self.__spark_session,
+                                             features_fingerprint)
+        if features is not None:
+            return features, True
+
+        (features_training, features_testing, features_evaluation) = \
+            self.__modeling_code_processing(
+                modeling_code,
+                self.__spark_session,
+                database_url_training,
+                database_url_test)
+
+        return {
+            "training": features_training,
+            "testing": features_testing,
+            "evaluation": features_evaluation,
+        }, False
+
+    def __cache_features(self, features_fingerprint: str,
+                         features: dict) -> None:
+        try:
+            self.__feature_cache.write(features_fingerprint, features)
+        except Exception:
+            traceback.print_exc()
+
+    def __persist_features(self, features: dict, storage_level: str) -> None:
+        for features_dataframe in features.values():
+            if features_dataframe is not None and \
+                    not features_dataframe.is_cached:
+                features_dataframe.persist(
+                    getattr(StorageLevel, storage_level))
+                features_dataframe.count()
+
+    def __unpersist_features(self, features: dict) -> None:
+        for features_dataframe in features.values():
+            if features_dataframe is not None and \
+                    features_dataframe.is_cached:
+                features_dataframe.unpersist()
+
+    def __features_cache_report(self, features: dict) -> dict:
+        rdds_storage = {
+            rdd_info.id(): rdd_info
+            for rdd_info in self.__spark_session.sparkContext._jsc.sc()
+            .getRDDStorageInfo()
+        }
+        cache_manager = \
+            self.__spark_session._jsparkSession.sharedState().cacheManager()
+
+        features_cache = {}
+        for features_name, features_dataframe in features.items():
+            if features_dataframe is None:
+                continue
+
+            try:
+                cached_data = cache_manager.lookupCachedData(
+                    features_dataframe._jdf)
+                if cached_data.isEmpty():
+                    features_cache[features_name] = None
+                    continue
+                cached_rdd_id = cached_data.get().cachedRepresentation() \
+                    .cacheBuilder().cachedColumnBuffers().id()
+            except Py4JError:
+                features_cache[features_name] = None
+                continue
+
+            rdd_info = rdds_storage.get(cached_rdd_id)
+            if rdd_info is None:
+                features_cache[features_name] = None
+                continue
+
+            features_cache[features_name] = {
+                "cachedPartitions": rdd_info.numCachedPartitions(),
+                "partitions": rdd_info.numPartitions(),
+                "memorySize": rdd_info.memSize(),
+                "diskSize": rdd_info.diskSize(),
+            }
+
+        return features_cache
+
     def __modeling_code_processing(self,
                                    modeling_code: str,
                                    spark_session: SparkSession,
@@ -109,65 +650,324 @@ class Builder:
                                 features_training: dataframe,
                                 features_testing: dataframe,
                                 features_evaluation: dataframe,
-                                metadata_document: dict
+                                metadata_document: dict,
+                                param_grid: dict,
+                                tuning: dict
                                 ) -> (object, dict):
-
         classifier.featuresCol = "features"
 
-        start_fit_model_time = time.time()
-        model = classifier.fit(features_training)
-        end_fit_model_time = time.time()
-
-        fit_time = end_fit_model_time - start_fit_model_time
-        metadata_document["fitTime"] = fit_time
+        with self.__instrumentation.job(
+                metadata_document["datasetName"],
+                "builder/sparkml classifier",
+                self.__sizing_policy.local_properties(
+                    metadata_document["sparkSizing"])):
+            start_fit_model_time = time.time()
+            if param_grid:
+                model, metadata_document["tuning"] = self.__tuned_fit(
+                    classifier, features_training, param_grid, tuning,
+                    EstimatorCatalog.is_regressor(
+                        metadata_document["estimator"]))
+            else:
+                model = classifier.fit(features_training)
+            end_fit_model_time = time.time()
+
+            fit_time = end_fit_model_time - start_fit_model_time
+            metadata_document["fitTime"] = fit_time
+
+            model_path = \
+                f'{self.__models_path}/{metadata_document["datasetName"]}'
+            PipelineModel(stages=[model]).write().overwrite().save(model_path)
+            self.__model_cache.invalidate(model_path)
+            metadata_document["modelPath"] = model_path
+
+            if features_evaluation is not None:
+                evaluation_prediction = model.transform(features_evaluation)
+                metrics = self.__metrics(metadata_document, model,
+                                         evaluation_prediction)
+
+                if not EstimatorCatalog.is_regressor(
+                        metadata_document["estimator"]):
+                    metadata_document["F1"] = str(
+                        metrics.get("weightedF1"))
+                    metadata_document["accuracy"] = str(
+                        metrics.get("accuracy"))
+                metadata_document["metrics"] = metrics
+            metadata_document["sparkSizing"] = self.__sizing_policy.observed(
+                metadata_document["sparkSizing"])
 
-        if features_evaluation is not None:
-            evaluation_prediction = model.transform(features_evaluation)
+        testing_prediction = model.transform(features_testing)
 
-            evaluator_f1 = MulticlassClassificationEvaluator(
-                labelCol="label", predictionCol="prediction", metricName="f1"
-            )
+        return testing_prediction, metadata_document
 
-            evaluator_accuracy = MulticlassClassificationEvaluator(
+    def __tuned_fit(self, classifier: object, features_training: dataframe,
+                    param_grid: dict, tuning: dict,
+                    is_regressor: bool) -> (object, dict):
+        param_grid_builder = ParamGridBuilder()
+        for param_name, param_values in param_grid.items():
+            param_grid_builder.addGrid(classifier.getParam(param_name),
+                                       param_values)
+        param_maps = param_grid_builder.build()
+
+        fit_times = {}
+
+        tuning_method = tuning.get("tuningMethod",
+                                   self.DEFAULT_TUNING_METHOD)
+        parallelism = tuning.get("parallelism",
+                                 self.DEFAULT_TUNING_PARALLELISM)
+        if is_regressor:
+            metric_name = "r2"
+            evaluator = RegressionEvaluator(
                 labelCol="label", predictionCol="prediction",
-                metricName="accuracy"
-            )
+                metricName=metric_name)
+        else:
+            metric_name = "f1"
+            evaluator = MulticlassClassificationEvaluator(
+                labelCol="label", predictionCol="prediction",
+                metricName=metric_name)
+
+        if tuning_method == self.TRAIN_VALIDATION_SPLIT:
+            tuner = TrainValidationSplit(
+                estimator=classifier, estimatorParamMaps=param_maps,
+                evaluator=evaluator, trainRatio=self.TUNING_TRAIN_RATIO,
+                parallelism=parallelism)
+            with self.__timed_fit_multiple(classifier, fit_times):
+                tuned_model = tuner.fit(features_training)
+            combination_metrics = tuned_model.validationMetrics
+        else:
+            tuner = CrossValidator(
+                estimator=classifier, estimatorParamMaps=param_maps,
+                evaluator=evaluator, numFolds=self.TUNING_NUM_FOLDS,
+                parallelism=parallelism)
+            with self.__timed_fit_multiple(classifier, fit_times):
+                tuned_model = tuner.fit(features_training)
+            combination_metrics = tuned_model.avgMetrics
+
+        combinations = []
+        for index, param_map in enumerate(param_maps):
+            combinations.append({
+                "params": {param.name: value
+                           for param, value in param_map.items()},
+                "score": combination_metrics[index],
+                "fitTimes": fit_times.get(index, []),
+            })
+        best_combination = max(combinations,
+                               key=lambda combination: combination["score"])
+
+        tuning_document = {
+            "tuningMethod": tuning_method,
+            "metricName": metric_name,
+            "parallelism": parallelism,
+            "bestParams": best_combination["params"],
+            "combinations": combinations,
+        }
 
-            evaluation_prediction.select("label", "prediction").show()
+        return tuned_model.bestModel, tuning_document
 
-            model_f1 = evaluator_f1.evaluate(evaluation_prediction)
-            model_accuracy = evaluator_accuracy.evaluate(evaluation_prediction)
+    @contextmanager
+    def __timed_fit_multiple(self, classifier: object, fit_times: dict):
+        fit_multiple = classifier.fitMultiple
 
-            metadata_document["F1"] = str(model_f1)
-            metadata_document["accuracy"] = str(model_accuracy)
+        def timed_fit_multiple(dataset, param_maps):
+            models_iterator = fit_multiple(dataset, param_maps)
 
-        testing_prediction = model.transform(features_testing)
+            class TimedModelsIterator:
+                def __iter__(self):
+                    return self
 
-        return testing_prediction, metadata_document
+                def __next__(self):
+                    start_fit_time = time.time()
+                    index, model = next(models_iterator)
+                    fit_times.setdefault(index, []).append(
+                        time.time() - start_fit_time)
+                    return index, model
+
+            return TimedModelsIterator()
+
+        classifier.fitMultiple = timed_fit_multiple
+        try:
+            yield
+        finally:
+            vars(classifier).pop("fitMultiple", None)
+
+    def __score_name(self, metadata_document: dict) -> str:
+        if EstimatorCatalog.is_regressor(metadata_document["estimator"]):
+            return self.REGRESSION_SCORE
+
+        return self.CLASSIFICATION_SCORE
+
+    def __metrics(self, metadata_document: dict, model: object,
+                  evaluation_prediction: dataframe) -> dict:
+        if EstimatorCatalog.is_regressor(metadata_document["estimator"]):
+            return self.__regression_metrics(evaluation_prediction)
+
+        return self.__evaluation_metrics(model, evaluation_prediction)
+
+    def __regression_metrics(self, evaluation_prediction: dataframe) -> dict:
+        error = functions.col("prediction") - functions.col("label")
+        aggregates = evaluation_prediction.agg(
+            functions.count(functions.lit(1)).alias("count"),
+            functions.sum(error * error).alias("squaredError"),
+            functions.sum(functions.abs(error)).alias("absoluteError"),
+            functions.var_pop("label").alias("labelVariance"),
+        ).first()
+
+        if not aggregates["count"]:
+            return {}
+
+        mean_squared_error = aggregates["squaredError"] / aggregates["count"]
+        label_variance = aggregates["labelVariance"]
+
+        return {
+            "mse": mean_squared_error,
+            "rmse": math.sqrt(mean_squared_error),
+            "mae": aggregates["absoluteError"] / aggregates["count"],
+            "r2": 1 - mean_squared_error / label_variance
+            if label_variance else None,
+        }
+
+    def __evaluation_metrics(self, model: object,
+                             evaluation_prediction: dataframe) -> dict:
+        is_binary = getattr(model, "numClasses", None) == 2 and \
+            "probability" in evaluation_prediction.columns
+
+        grouping_columns = [functions.col("label"),
+                            functions.col("prediction")]
+        if is_binary:
+            positive_score = self.__vector_to_array("probability")[1]
+            grouping_columns.append(functions.least(
+                functions.floor(positive_score * self.AUC_SCORE_BUCKETS),
+                functions.lit(self.AUC_SCORE_BUCKETS - 1)
+            ).alias("scoreBucket"))
+
+        grouped_counts = evaluation_prediction.groupBy(
+            *grouping_columns).count().collect()
+
+        confusion_counts = {}
+        score_counts = {}
+        for row in grouped_counts:
+            confusion_key = (row["label"], row["prediction"])
+            confusion_counts[confusion_key] = \
+                confusion_counts.get(confusion_key, 0) + row["count"]
+
+            if is_binary and row["scoreBucket"] is not None:
+                bucket_counts = score_counts.setdefault(row["scoreBucket"],
+                                                        [0, 0])
+                bucket_counts[int(row["label"] == 1.0)] += row["count"]
+
+        total_count = sum(confusion_counts.values())
+        if total_count == 0:
+            return {}
+
+        labels = sorted({label for label, _ in confusion_counts} |
+                        {prediction for _, prediction in confusion_counts})
+        metrics = {
+            "accuracy": sum(confusion_counts.get((label, label), 0)
+                            for label in labels) / total_count,
+            "weightedPrecision": 0.0,
+            "weightedRecall": 0.0,
+            "weightedF1": 0.0,
+            "classes": [],
+            "confusionMatrix": [
+                {"label": label, "prediction": prediction, "count": count}
+                for (label, prediction), count in
+                sorted(confusion_counts.items())
+            ],
+        }
+
+        for label in labels:
+            true_positives = confusion_counts.get((label, label), 0)
+            support = sum(count for (actual, _), count in
+                          confusion_counts.items() if actual == label)
+            predicted = sum(count for (_, prediction), count in
+                            confusion_counts.items() if prediction == label)
+
+            precision = true_positives / predicted if predicted else 0.0
+            recall = true_positives / support if support else 0.0
+            f1 = 2 * precision * recall / (precision + recall) \
+                if precision + recall else 0.0
+
+            weight = support / total_count
+            metrics["weightedPrecision"] += precision * weight
+            metrics["weightedRecall"] += recall * weight
+            metrics["weightedF1"] += f1 * weight
+            metrics["classes"].append({
+                "label": label,
+                "precision": precision,
+                "recall": recall,
+                "f1": f1,
+                "support": support,
+            })
+
+        if is_binary:
+            metrics["areaUnderROC"] = self.__area_under_roc(score_counts)
+
+        return metrics
+
+    def __area_under_roc(self, score_counts: dict) -> float:
+        negatives = sum(counts[0] for counts in score_counts.values())
+        positives = sum(counts[1] for counts in score_counts.values())
+        if not negatives or not positives:
+            return None
+
+        area = 0.0
+        ranked_positives = 0
+        for score_bucket in sorted(score_counts, reverse=True):
+            bucket_negatives, bucket_positives = score_counts[score_bucket]
+            area += bucket_negatives * (ranked_positives +
+                                        bucket_positives / 2)
+            ranked_positives += bucket_positives
+
+        return area / (positives * negatives)
 
     def __save_classifier_result(self, predicted_df: dataframe,
-                                 filename_metadata: dict) -> None:
+                                 filename_metadata: dict,
+                                 prediction_url: str,
+                                 description: str) -> None:
         self.__database.update_one(
             filename_metadata["datasetName"],
             filename_metadata,
             {self.DOCUMENT_ID_NAME: self.METADATA_DOCUMENT_ID})
 
-        document_id = 1
-        for row in predicted_df.collect():
-            row_dict = row.asDict()
-            row_dict["_id"] = document_id
-            row_dict["probability"] = row_dict["probability"].toArray().tolist()
+        prediction_df = predicted_df.drop("features", "rawPrediction")
+        if "probability" in prediction_df.columns:
+            prediction_df = prediction_df.withColumn(
+                "probability", self.__vector_to_array("probability"))
+
+        with self.__instrumentation.job(
+                filename_metadata["datasetName"], description,
+                self.__sizing_policy.local_properties(
+                    filename_metadata["sparkSizing"])):
+            self.__indexed_dataframe(prediction_df).write.format(
+                self.MONGO_SPARK_SOURCE).mode("append").option(
+                "spark.mongodb.output.uri", prediction_url).save()
+
+        spark_stages = self.__instrumentation.stages(
+            filename_metadata["datasetName"])
+        self.__metadata_creator.update_spark_statistics(
+            filename_metadata["datasetName"], spark_stages,
+            Instrumentation.summary(spark_stages))
 
-            document_id += 1
+        self.__metadata_creator.update_finished_flag(
+            filename_metadata["datasetName"], True)
 
-            del row_dict["features"]
-            del row_dict["rawPrediction"]
+    def __vector_to_array(self, column_name: str) -> Column:
+        vector_json = functions.to_json(
+            functions.struct(functions.col(column_name).alias("vector")))
+        vector = functions.from_json(
+            vector_json,
+            StructType([StructField("vector", self.VECTOR_SCHEMA)]))
 
-            self.__database.insert_one_in_file(filename_metadata["datasetName"],
-                                               row_dict)
+        return vector["vector"]["values"]
 
-        self.__metadata_creator.update_finished_flag(
-            filename_metadata["datasetName"], True)
+    def __indexed_dataframe(self, dataframe_object: dataframe) -> dataframe:
+        indexed_rdd = dataframe_object.rdd.zipWithIndex().map(
+            lambda row_index: (*row_index[0], row_index[1] + 1))
+        indexed_schema = StructType(
+            dataframe_object.schema.fields +
+            [StructField(self.DOCUMENT_ID_NAME, LongType(), False)])
+
+        return self.__spark_session.createDataFrame(indexed_rdd,
+                                                    indexed_schema)
 
     def __file_processor(self, database_url: str,
                          spark_session: SparkSession) -> dataframe:
@@ -0,0 +1,62 @@
+import importlib
+from pyspark.ml import Estimator
+
+
+class EstimatorCatalog:
+    CLASSIFICATION_MODULE = "pyspark.ml.classification"
+    REGRESSION_MODULE = "pyspark.ml.regression"
+    ESTIMATOR_MODULES = [CLASSIFICATION_MODULE, REGRESSION_MODULE]
+    MODULE_PATH_NAME = "modulePath"
+    CLASS_NAME = "class"
+    CLASS_PARAMETERS_NAME = "classParameters"
+    PREDICTOR_PARAMS = ["featuresCol", "labelCol", "predictionCol"]
+    OPTIONAL_PARAMS = ["weightCol", "thresholds", "initialWeights",
+                       "lowerBoundsOnCoefficients",
+                       "upperBoundsOnCoefficients",
+                       "lowerBoundsOnIntercepts", "upperBoundsOnIntercepts",
+                       "quantilesCol", "varianceCol", "link", "linkPower",
+                       "linkPredictionCol", "offsetCol"]
+    SHORT_NAMES = {
+        "LR": "LogisticRegression",
+        "DT": "DecisionTreeClassifier",
+        "RF": "RandomForestClassifier",
+        "GB": "GBTClassifier",
+        "NB": "NaiveBayes",
+    }
+
+    @classmethod
+    def name(cls, classifier) -> str:
+        if type(classifier) == str:
+            return classifier
+
+        return classifier[cls.CLASS_NAME]
+
+    @classmethod
+    def specification(cls, classifier) -> dict:
+        if type(classifier) == str:
+            return {
+                cls.MODULE_PATH_NAME: cls.CLASSIFICATION_MODULE,
+                cls.CLASS_NAME: cls.SHORT_NAMES[classifier],
+                cls.CLASS_PARAMETERS_NAME: {},
+            }
+
+        return {
+            cls.MODULE_PATH_NAME: classifier[cls.MODULE_PATH_NAME],
+            cls.CLASS_NAME: classifier[cls.CLASS_NAME],
+            cls.CLASS_PARAMETERS_NAME:
+                classifier.get(cls.CLASS_PARAMETERS_NAME, {}),
+        }
+
+    @classmethod
+    def estimator_class(cls, specification: dict) -> type:
+        module = importlib.import_module(specification[cls.MODULE_PATH_NAME])
+        return getattr(module, specification[cls.CLASS_NAME])
+
+    @classmethod
+    def instantiate(cls, specification: dict) -> Estimator:
+        return cls.estimator_class(specification)(
+            **specification[cls.CLASS_PARAMETERS_NAME])
+
+    @classmethod
+    def is_regressor(cls, specification: dict) -> bool:
+        return specification[cls.MODULE_PATH_NAME] == cls.REGRESSION_MODULE
@@ -1,6 +1,7 @@
 from flask import jsonify, request, Flask
 import os
-from builder import Builder
+from builder import Builder, ModelCache, FeatureCache
+from estimator import EstimatorCatalog
 from pyspark.sql import SparkSession
 from utils import Database, UserRequest, Metadata
 
@@ -21,12 +22,21 @@ DATABASE_REPLICA_SET = "DATABASE_REPLICA_SET"
 SPARKMASTER_HOST = "SPARKMASTER_HOST"
 SPARKMASTER_PORT = "SPARKMASTER_PORT"
 SPARK_DRIVER_PORT = "SPARK_DRIVER_PORT"
+SPARK_MAX_EXECUTORS = "SPARK_MAX_EXECUTORS"
 BUILDER_HOST_NAME = "BUILDER_HOST_NAME"
+MODELS_VOLUME_PATH = "MODELS_VOLUME_PATH"
+FEATURES_CACHE_PATH = "FEATURES_CACHE_PATH"
+FEATURES_CACHE_BUDGET = "FEATURES_CACHE_BUDGET"
 
 TRAINING_FILENAME = "trainDatasetName"
 TEST_FILENAME = "testDatasetName"
 MODELING_CODE_NAME = "modelingCode"
 CLASSIFIERS_NAME = "classifiersList"
+STORAGE_LEVEL_NAME = "storageLevel"
+PARAM_GRID_NAME = "paramGrid"
+TUNING_METHOD_NAME = "tuningMethod"
+PARALLELISM_NAME = "parallelism"
+TIME_BUDGET_NAME = "timeBudget"
 FIRST_ARGUMENT = 0
 
 MICROSERVICE_URI_GET = "/api/learningOrchestra/v1/builder/sparkml/"
@@ -46,6 +56,13 @@ database = Database(
 request_validator = UserRequest(database)
 
 metadata_creator = Metadata(database)
+model_cache = ModelCache()
+models_path = os.environ[MODELS_VOLUME_PATH]
+os.makedirs(os.environ[FEATURES_CACHE_PATH], exist_ok=True)
+feature_cache = FeatureCache(
+    os.environ[FEATURES_CACHE_PATH],
+    int(os.environ.get(FEATURES_CACHE_BUDGET,
+                       FeatureCache.DEFAULT_DISK_BUDGET)))
 
 spark_session = SparkSession.builder.appName("builder/sparkml"). \
     config("spark.driver.port", os.environ[SPARK_DRIVER_PORT]). \
@@ -54,9 +71,15 @@ spark_session = SparkSession.builder.appName("builder/sparkml"). \
     config("spark.jars.packages",
            "org.mongodb.spark:mongo-spark-connector_2.11:2.4.2",
            ). \
-    config("spark.cores.max", 3). \
+    config("spark.cores.max", os.environ[SPARK_MAX_EXECUTORS]). \
     config("spark.executor.cores", 1). \
     config("spark.executor.memory", "512m"). \
+    config("spark.dynamicAllocation.enabled", "true"). \
+    config("spark.dynamicAllocation.minExecutors", 0). \
+    config("spark.dynamicAllocation.maxExecutors",
+           os.environ[SPARK_MAX_EXECUTORS]). \
+    config("spark.dynamicAllocation.executorIdleTimeout", "60s"). \
+    config("spark.shuffle.service.enabled", "true"). \
     config("spark.scheduler.mode", "FAIR"). \
     config("spark.scheduler.pool", "builder/sparkml"). \
     config("spark.scheduler.allocation.file",
@@ -71,17 +94,37 @@ spark_session = SparkSession.builder.appName("builder/sparkml"). \
 def create_model():
     train_filename = request.json[TRAINING_FILENAME]
     test_filename = request.json[TEST_FILENAME]
-    classifiers_name = request.json[CLASSIFIERS_NAME]
+    classifiers_list = request.json[CLASSIFIERS_NAME]
+    storage_level = request.json.get(STORAGE_LEVEL_NAME,
+                                     Builder.DEFAULT_STORAGE_LEVEL)
+    tuning = {
+        PARAM_GRID_NAME: request.json.get(PARAM_GRID_NAME, {}),
+        TUNING_METHOD_NAME: request.json.get(
+            TUNING_METHOD_NAME, Builder.DEFAULT_TUNING_METHOD),
+        PARALLELISM_NAME: request.json.get(
+            PARALLELISM_NAME, Builder.DEFAULT_TUNING_PARALLELISM),
+    }
+    time_budget = request.json.get(TIME_BUDGET_NAME)
 
     request_errors = analyse_request_errors(
         request_validator,
         train_filename,
         test_filename,
-        classifiers_name)
+        classifiers_list,
+        storage_level,
+        tuning,
+        time_budget)
 
     if request_errors is not None:
         return request_errors
 
+    classifiers_specification = {
+        EstimatorCatalog.name(classifier):
+            EstimatorCatalog.specification(classifier)
+        for classifier in classifiers_list
+    }
+    classifiers_name = list(classifiers_specification)
+
     database_url_training = Database.collection_database_url(
         database_url,
         database_name,
@@ -95,13 +138,25 @@ def create_model():
         test_filename,
         database_replica_set,
     )
-    builder = Builder(database, metadata_creator, spark_session)
+    prediction_urls = {
+        classifier_name: Database.collection_database_url(
+            database_url,
+            database_name,
+            Database.create_prediction_filename(test_filename,
+                                                classifier_name),
+            database_replica_set,
+        )
+        for classifier_name in classifiers_name
+    }
+    builder = Builder(database, metadata_creator, spark_session,
+                      models_path, model_cache, feature_cache)
 
     builder.build(
         request.json[MODELING_CODE_NAME],
-        classifiers_name, train_filename,
+        classifiers_specification, train_filename,
         test_filename, database_url_training,
-        database_url_test
+        database_url_test, prediction_urls, storage_level, tuning,
+        time_budget
     )
 
     return (
@@ -114,6 +169,73 @@ def create_model():
     )
 
 
+@app.route("/models/<model_name>/predict", methods=["POST"])
+def predict_model(model_name):
+    test_filename = request.json[TEST_FILENAME]
+
+    try:
+        request_validator.model_validator(model_name)
+        request_validator.parent_filename_validator(test_filename)
+        request_validator.finished_processing_validator(test_filename)
+    except Exception as invalid_filename:
+        return (
+            jsonify({MESSAGE_RESULT: invalid_filename.args[
+                FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
+    model_metadata = database.find_one(model_name,
+                                       {"datasetName": model_name})
+    classifier_name = model_metadata["classifier"]
+    train_filename = model_metadata["parentDatasetName"][0]
+
+    try:
+        request_validator.parent_filename_validator(train_filename)
+        request_validator.predictions_filename_validator(
+            test_filename, [classifier_name])
+    except Exception as invalid_prediction_filename:
+        return (
+            jsonify({MESSAGE_RESULT: invalid_prediction_filename.args[
+                FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_CONFLICT,
+        )
+
+    database_url_training = Database.collection_database_url(
+        database_url,
+        database_name,
+        train_filename,
+        database_replica_set,
+    )
+
+    database_url_test = Database.collection_database_url(
+        database_url,
+        database_name,
+        test_filename,
+        database_replica_set,
+    )
+
+    prediction_url = Database.collection_database_url(
+        database_url,
+        database_name,
+        Database.create_prediction_filename(test_filename, classifier_name),
+        database_replica_set,
+    )
+
+    builder = Builder(database, metadata_creator, spark_session,
+                      models_path, model_cache, feature_cache)
+    builder.predict(model_metadata, test_filename, database_url_training,
+                    database_url_test, prediction_url)
+
+    return (
+        jsonify({
+            MESSAGE_RESULT:
+                create_prediction_files_uri(
+                    [classifier_name],
+                    test_filename)}),
+        HTTP_STATUS_CODE_SUCCESS_CREATED,
+    )
+
+
 def create_prediction_files_uri(classifiers_list, test_filename):
     classifiers_uri = []
     for classifier in classifiers_list:
@@ -127,7 +249,8 @@ def create_prediction_files_uri(classifiers_list, test_filename):
 
 
 def analyse_request_errors(request_validator, train_filename,
-                           test_filename, classifiers_name):
+                           test_filename, classifiers_list, storage_level,
+                           tuning, time_budget):
     try:
         request_validator.parent_filename_validator(
             train_filename)
@@ -143,7 +266,7 @@ def analyse_request_errors(request_validator, train_filename,
 
     try:
         request_validator.model_classifiers_validator(
-            classifiers_name
+            classifiers_list
         )
     except Exception as invalid_classifier_name:
         return (
@@ -152,6 +275,37 @@ def analyse_request_errors(request_validator, train_filename,
             HTTP_STATUS_CODE_NOT_ACCEPTABLE,
         )
 
+    try:
+        request_validator.storage_level_validator(storage_level)
+    except Exception as invalid_storage_level:
+        return (
+            jsonify(
+                {MESSAGE_RESULT: invalid_storage_level.args[FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
+    try:
+        request_validator.param_grid_validator(classifiers_list,
+                                               tuning[PARAM_GRID_NAME])
+        request_validator.tuning_validator(tuning[TUNING_METHOD_NAME],
+                                           tuning[PARALLELISM_NAME])
+    except Exception as invalid_tuning:
+        return (
+            jsonify(
+                {MESSAGE_RESULT: invalid_tuning.args[FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
+    try:
+        request_validator.time_budget_validator(time_budget,
+                                               classifiers_list)
+    except Exception as invalid_time_budget:
+        return (
+            jsonify(
+                {MESSAGE_RESULT: invalid_time_budget.args[FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
     try:
         request_validator.finished_processing_validator(
             train_filename)
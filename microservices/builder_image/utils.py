@@ -1,6 +1,9 @@
 from datetime import datetime
 import pytz
-from pymongo import MongoClient
+from pymongo import MongoClient, DESCENDING
+from inspect import isclass
+from pyspark.ml import Estimator
+from estimator import EstimatorCatalog
 
 
 class Database:
@@ -16,6 +19,21 @@ class Database:
         file_collection = self.database[filename]
         return file_collection.find_one(query)
 
+    def dataset_version(self, filename):
+        file_collection = self.database[filename]
+        dataset_metadata = file_collection.find_one({"_id": 0})
+        last_document = file_collection.find_one(
+            {}, sort=[("_id", DESCENDING)])
+
+        return {
+            "timeCreated": dataset_metadata.get("timeCreated"),
+            "version": dataset_metadata.get("version"),
+            "lastDocumentId": last_document["_id"],
+        }
+
+    def collection_statistics(self, filename):
+        return self.database.command("collstats", filename)
+
     def update_one(self, filename, new_value, query):
         new_values_query = {"$set": new_value}
         file_collection = self.database[filename]
@@ -75,6 +93,17 @@ class Metadata:
 
         return metadata
 
+    def update_spark_statistics(self, filename, spark_stages,
+                                spark_summary):
+        spark_statistics_query = {
+            "sparkStages": spark_stages,
+            "sparkSummary": spark_summary,
+        }
+        metadata_file_query = {"_id": 0}
+        self.database_connector.update_one(filename,
+                                           spark_statistics_query,
+                                           metadata_file_query)
+
     def update_finished_flag(self, filename, flag):
         flag_true_query = {"finished": flag}
         metadata_file_query = {"_id": 0}
@@ -86,8 +115,16 @@ class Metadata:
 class UserRequest:
     MESSAGE_INVALID_FILENAME = "invalid input dataset name"
     MESSAGE_INVALID_CLASSIFIER = "invalid classifier name"
+    MESSAGE_INVALID_MODULE_PATH = "invalid module path name"
+    MESSAGE_INVALID_CLASS = "invalid class name"
+    MESSAGE_INVALID_CLASS_PARAMETER = "invalid class parameter"
     MESSAGE_INVALID_PREDICTION_NAME = "prediction dataset name already exists"
     MESSAGE_UNFINISHED_PROCESSING = "unfinished processing in input dataset"
+    MESSAGE_INVALID_STORAGE_LEVEL = "invalid storage level"
+    MESSAGE_INVALID_MODEL = "invalid model name"
+    MESSAGE_INVALID_PARAM_GRID = "invalid param grid"
+    MESSAGE_INVALID_TUNING = "invalid tuning options"
+    MESSAGE_INVALID_TIME_BUDGET = "invalid time budget"
 
     def __init__(self, database_connector):
         self.database = database_connector
@@ -107,6 +144,23 @@ class UserRequest:
         if not filename_metadata["finished"]:
             raise Exception(self.MESSAGE_UNFINISHED_PROCESSING)
 
+    def model_validator(self, model_name):
+        filenames = self.database.get_filenames()
+
+        if model_name not in filenames:
+            raise Exception(self.MESSAGE_INVALID_MODEL)
+
+        model_metadata_query = {"datasetName": model_name}
+        model_metadata = self.database.find_one(model_name,
+                                                model_metadata_query)
+
+        if model_metadata.get("type") != "builder/sparkml" or \
+                "modelPath" not in model_metadata:
+            raise Exception(self.MESSAGE_INVALID_MODEL)
+
+        if not model_metadata["finished"]:
+            raise Exception(self.MESSAGE_UNFINISHED_PROCESSING)
+
     def predictions_filename_validator(self, test_filename, classifier_list):
         filenames = self.database.get_filenames()
 
@@ -117,7 +171,124 @@ class UserRequest:
                 raise Exception(self.MESSAGE_INVALID_PREDICTION_NAME)
 
     def model_classifiers_validator(self, classifiers_list):
-        classifier_names_list = ["LR", "DT", "RF", "GB", "NB"]
-        for classifier_name in classifiers_list:
-            if classifier_name not in classifier_names_list:
+        if type(classifiers_list) != list or not classifiers_list:
+            raise Exception(self.MESSAGE_INVALID_CLASSIFIER)
+
+        classifier_names = set()
+        for classifier in classifiers_list:
+            if type(classifier) == str:
+                if classifier not in EstimatorCatalog.SHORT_NAMES:
+                    raise Exception(self.MESSAGE_INVALID_CLASSIFIER)
+            elif type(classifier) == dict:
+                self.estimator_validator(classifier)
+            else:
                 raise Exception(self.MESSAGE_INVALID_CLASSIFIER)
+
+            classifier_name = EstimatorCatalog.name(classifier)
+            if classifier_name in classifier_names:
+                raise Exception(self.MESSAGE_INVALID_CLASSIFIER)
+            classifier_names.add(classifier_name)
+
+    def estimator_validator(self, classifier):
+        module_path = classifier.get(EstimatorCatalog.MODULE_PATH_NAME)
+        if module_path not in EstimatorCatalog.ESTIMATOR_MODULES:
+            raise Exception(self.MESSAGE_INVALID_MODULE_PATH)
+
+        class_name = classifier.get(EstimatorCatalog.CLASS_NAME)
+        if type(class_name) != str or class_name.startswith("_"):
+            raise Exception(self.MESSAGE_INVALID_CLASS)
+
+        specification = EstimatorCatalog.specification(classifier)
+        try:
+            estimator_class = EstimatorCatalog.estimator_class(specification)
+        except AttributeError:
+            raise Exception(self.MESSAGE_INVALID_CLASS)
+
+        if not isclass(estimator_class) or \
+                not issubclass(estimator_class, Estimator):
+            raise Exception(self.MESSAGE_INVALID_CLASS)
+
+        estimator = estimator_class()
+        for param_name in EstimatorCatalog.PREDICTOR_PARAMS:
+            if not estimator.hasParam(param_name):
+                raise Exception(self.MESSAGE_INVALID_CLASS)
+
+        class_parameters = specification[
+            EstimatorCatalog.CLASS_PARAMETERS_NAME]
+        if type(class_parameters) != dict:
+            raise Exception(self.MESSAGE_INVALID_CLASS_PARAMETER)
+
+        for parameter_name in class_parameters:
+            if not estimator.hasParam(parameter_name) or \
+                    parameter_name in EstimatorCatalog.PREDICTOR_PARAMS:
+                raise Exception(self.MESSAGE_INVALID_CLASS_PARAMETER)
+
+        try:
+            estimator = EstimatorCatalog.instantiate(specification)
+        except (TypeError, ValueError):
+            raise Exception(self.MESSAGE_INVALID_CLASS_PARAMETER)
+
+        for param in estimator.params:
+            if not estimator.isDefined(param) and \
+                    param.name not in EstimatorCatalog.OPTIONAL_PARAMS:
+                raise Exception(self.MESSAGE_INVALID_CLASS_PARAMETER)
+
+    def storage_level_validator(self, storage_level):
+        storage_level_names = ["MEMORY_ONLY", "MEMORY_ONLY_2",
+                               "MEMORY_AND_DISK", "MEMORY_AND_DISK_2",
+                               "DISK_ONLY", "DISK_ONLY_2"]
+        if storage_level not in storage_level_names:
+            raise Exception(self.MESSAGE_INVALID_STORAGE_LEVEL)
+
+    def param_grid_validator(self, classifiers_list, param_grid):
+        classifier_specifications = {
+            EstimatorCatalog.name(classifier):
+                EstimatorCatalog.specification(classifier)
+            for classifier in classifiers_list
+        }
+
+        if type(param_grid) != dict:
+            raise Exception(self.MESSAGE_INVALID_PARAM_GRID)
+
+        for classifier_name, classifier_grid in param_grid.items():
+            if classifier_name not in classifier_specifications or \
+                    type(classifier_grid) != dict:
+                raise Exception(self.MESSAGE_INVALID_PARAM_GRID)
+
+            classifier = EstimatorCatalog.instantiate(
+                classifier_specifications[classifier_name])
+            for param_name, param_values in classifier_grid.items():
+                if not classifier.hasParam(param_name) or \
+                        param_name in EstimatorCatalog.PREDICTOR_PARAMS or \
+                        type(param_values) != list or not param_values:
+                    raise Exception(self.MESSAGE_INVALID_PARAM_GRID)
+
+                type_converter = classifier.getParam(param_name).typeConverter
+                for param_value in param_values:
+                    try:
+                        type_converter(param_value)
+                    except (TypeError, ValueError):
+                        raise Exception(self.MESSAGE_INVALID_PARAM_GRID)
+
+    def tuning_validator(self, tuning_method, parallelism):
+        tuning_methods = ["crossValidation", "trainValidationSplit"]
+        if tuning_method not in tuning_methods:
+            raise Exception(self.MESSAGE_INVALID_TUNING)
+
+        if type(parallelism) != int or parallelism < 1:
+            raise Exception(self.MESSAGE_INVALID_TUNING)
+
+    def time_budget_validator(self, time_budget, classifiers_list):
+        if time_budget is None:
+            return
+
+        if type(time_budget) not in [int, float] or time_budget <= 0:
+            raise Exception(self.MESSAGE_INVALID_TIME_BUDGET)
+
+        estimator_kinds = {
+            EstimatorCatalog.is_regressor(
+                EstimatorCatalog.specification(classifier))
+            for classifier in classifiers_list
+        }
+        if len(estimator_kinds) > 1:
+            raise Exception(self.MESSAGE_INVALID_TIME_BUDGET)
@@ -1,4 +1,7 @@
 from concurrent.futures import ThreadPoolExecutor
+import time
+import numpy as np
+import pandas as pd
 
 
 class DataType:
@@ -6,54 +9,367 @@ class DataType:
     DOCUMENT_ID_NAME = "_id"
     STRING_TYPE = "string"
     NUMBER_TYPE = "number"
+    INTEGER_TYPE = "integer"
+    FLOAT32_TYPE = "float32"
+    BOOLEAN_TYPE = "boolean"
+    DATETIME_TYPE = "datetime"
+    CATEGORY_TYPE = "category"
+    TYPE_NAME = "type"
+    FORMAT_NAME = "format"
+    CATEGORY_CODE_SUFFIX = "_code"
+    ENGINE = "python"
+    DEFAULT_PARALLELISM = 4
+    RANGE_SIZE = 10000
+    MAX_INTEGER_VALUE = 9.2e18
+    BOOLEAN_VALUES = {
+        "true": True, "t": True, "yes": True, "y": True, "1": True,
+        "1.0": True,
+        "false": False, "f": False, "no": False, "n": False, "0": False,
+        "0.0": False,
+    }
 
-    def __init__(self, database_connector, metadata_handler):
+    def __init__(self, database_connector, metadata_handler,
+                 parallelism=DEFAULT_PARALLELISM):
         self.database_connector = database_connector
         self.thread_pool = ThreadPoolExecutor()
         self.metadata_handler = metadata_handler
+        self.parallelism = parallelism
+        self.type_converter_switcher = {
+            self.STRING_TYPE: self.string_converter,
+            self.NUMBER_TYPE: self.number_converter,
+            self.INTEGER_TYPE: self.integer_converter,
+            self.FLOAT32_TYPE: self.float32_converter,
+            self.BOOLEAN_TYPE: self.boolean_converter,
+            self.DATETIME_TYPE: self.datetime_converter,
+            self.CATEGORY_TYPE: self.category_converter,
+        }
 
-    def field_converter(self, filename, field, field_type):
-        query = {}
-        for document in self.database_connector.find(filename, query):
-            if document[self.DOCUMENT_ID_NAME] == self.METADATA_DOCUMENT_ID:
+    @staticmethod
+    def field_type_name(field_type):
+        if type(field_type) == dict:
+            return field_type[DataType.TYPE_NAME]
+        return field_type
+
+    @staticmethod
+    def field_type_format(field_type):
+        if type(field_type) == dict:
+            return field_type.get(DataType.FORMAT_NAME)
+        return None
+
+    @staticmethod
+    def category_code_field(field):
+        return field + DataType.CATEGORY_CODE_SUFFIX
+
+    def python_values(self, values, valid_values):
+        result = np.full(len(values), None, dtype=object)
+        result[valid_values.to_numpy()] = values[valid_values].to_numpy()
+        return result.tolist()
+
+    def numeric_values(self, values):
+        empty_values = values == ""
+        numbers = pd.to_numeric(values.where(~empty_values),
+                                errors="coerce")
+        errors = int((values.notna() & ~empty_values & numbers.isna()).sum())
+
+        return numbers, errors
+
+    def integral_values(self, numbers):
+        return numbers.notna() & \
+               (numbers.abs() < self.MAX_INTEGER_VALUE) & \
+               (numbers == np.floor(numbers))
+
+    def string_converter(self, values, field, field_format, categories):
+        strings = values.where(values.notna(), "").astype(str)
+
+        return {field: strings.tolist()}, 0
+
+    def number_converter(self, values, field, field_format, categories):
+        numbers, errors = self.numeric_values(values)
+        integral_numbers = self.integral_values(numbers)
+
+        converted_values = np.full(len(values), None, dtype=object)
+        converted_values[numbers.notna().to_numpy()] = \
+            numbers[numbers.notna()].to_numpy()
+        converted_values[integral_numbers.to_numpy()] = \
+            numbers[integral_numbers].astype(np.int64).to_numpy()
+
+        return {field: converted_values.tolist()}, errors
+
+    def integer_converter(self, values, field, field_format, categories):
+        numbers, errors = self.numeric_values(values)
+        integral_numbers = self.integral_values(numbers)
+        errors += int((numbers.notna() & ~integral_numbers).sum())
+
+        integers = numbers.where(integral_numbers, 0).astype(np.int64)
+
+        return {field: self.python_values(integers, integral_numbers)}, \
+            errors
+
+    def float32_converter(self, values, field, field_format, categories):
+        numbers, errors = self.numeric_values(values)
+        floats = numbers.astype(np.float32).astype(np.float64)
+
+        return {field: self.python_values(floats, floats.notna())}, errors
+
+    def boolean_converter(self, values, field, field_format, categories):
+        valid_values = values.notna() & (values != "")
+        booleans = values[valid_values].astype(str).str.strip().str.lower(). \
+            map(self.BOOLEAN_VALUES).reindex(values.index)
+        errors = int((valid_values & booleans.isna()).sum())
+
+        return {field: self.python_values(booleans, booleans.notna())}, \
+            errors
+
+    def datetime_converter(self, values, field, field_format, categories):
+        empty_values = values == ""
+        datetimes = pd.to_datetime(values.where(~empty_values),
+                                   format=field_format, errors="coerce")
+        errors = int(
+            (values.notna() & ~empty_values & datetimes.isna()).sum())
+
+        converted_values = np.full(len(values), None, dtype=object)
+        valid_datetimes = datetimes.notna()
+        converted_values[valid_datetimes.to_numpy()] = \
+            datetimes[valid_datetimes].dt.to_pydatetime()
+
+        return {field: converted_values.tolist()}, errors
+
+    def category_converter(self, values, field, field_format, categories):
+        valid_values = values.notna() & (values != "")
+        labels = values.where(valid_values).astype(str)
+        codes = pd.Series(
+            pd.Categorical(labels.where(valid_values),
+                           categories=categories[field]).codes,
+            index=values.index)
+        coded_values = codes >= 0
+        errors = int((valid_values & ~coded_values).sum())
+
+        return {
+                   field: self.python_values(labels, valid_values),
+                   self.category_code_field(field):
+                       self.python_values(codes, coded_values),
+               }, errors
+
+    def range_converter(self, filename, fields_dictionary, first_id,
+                        last_id, categories):
+        range_query = {
+            self.DOCUMENT_ID_NAME: {"$gte": first_id, "$lt": last_id}}
+        fields_projection = {field: True for field in fields_dictionary}
+
+        documents = [
+            document for document in self.database_connector.find(
+                filename, range_query, fields_projection)
+            if document[self.DOCUMENT_ID_NAME] != self.METADATA_DOCUMENT_ID
+        ]
+
+        converted_columns = {}
+        conversion_errors = {}
+        for field, field_type in fields_dictionary.items():
+            values = pd.Series(
+                [document.get(field) for document in documents],
+                dtype=object)
+            type_name = self.field_type_name(field_type)
+            type_converter = self.type_converter_switcher[type_name]
+
+            field_columns, field_errors = type_converter(
+                values, field, self.field_type_format(field_type),
+                categories)
+
+            converted_columns.update(field_columns)
+            conversion_errors[type_name] = \
+                conversion_errors.get(type_name, 0) + field_errors
+
+        documents_values = []
+        for index, document in enumerate(documents):
+            values = {
+                column: column_values[index]
+                for column, column_values in converted_columns.items()
+            }
+            documents_values.append(
+                (document[self.DOCUMENT_ID_NAME], values))
+
+        self.database_connector.update_many_by_id(filename, documents_values)
+
+        return conversion_errors
+
+    def categories_builder(self, filename, fields_dictionary):
+        categories = {}
+        for field, field_type in fields_dictionary.items():
+            if self.field_type_name(field_type) != self.CATEGORY_TYPE:
                 continue
 
-            values = {}
-            if field_type == self.STRING_TYPE:
-                if document[field] == str:
-                    continue
-                if document[field] is None:
-                    values[field] = ""
-                else:
-                    values[field] = str(document[field])
+            distinct_values = self.database_connector.distinct_values(
+                filename, field)
+            categories[field] = sorted({
+                str(value) for value in distinct_values
+                if value is not None and value != ""
+            })
 
-            elif field_type == self.NUMBER_TYPE:
-                if (
-                        document[field] == int
-                        or document[field] == float
-                        or document[field] is None
-                ):
-                    continue
-                if document[field] == "":
-                    values[field] = None
-                else:
-                    values[field] = float(document[field])
-
-                    if values[field].is_integer():
-                        values[field] = int(values[field])
-
-            self.database_connector.update_one(filename, values, document)
+        return categories
 
     def convert_existent_file(self, filename, fields_dictionary):
 
         self.metadata_handler.update_finished_flag(filename, False)
+        self.metadata_handler.create_checkpoint(
+            filename, fields_dictionary, self.ENGINE, self.parallelism,
+            self.RANGE_SIZE)
 
         self.thread_pool.submit(self.field_file_converter, filename,
                                 fields_dictionary)
 
+    def resume_existent_file(self, filename, checkpoint):
+        self.thread_pool.submit(self.field_file_converter, filename,
+                                checkpoint["fields"])
+
     def field_file_converter(self, filename, fields_dictionary):
-        for field in fields_dictionary:
-            self.field_converter(filename, field,
-                                 fields_dictionary[field])
+        start_conversion_time = time.time()
+
+        checkpoint = self.metadata_handler.read_checkpoint(filename)
+        range_size = checkpoint["rangeSize"]
+        completed_ranges = set(checkpoint["completedRanges"])
+        resumed = bool(completed_ranges)
+
+        categories = checkpoint.get("categories")
+        if categories is None:
+            categories = self.categories_builder(filename, fields_dictionary)
+            self.metadata_handler.update_categories(filename, categories)
+
+        last_document_id = self.database_connector.find_last_document_id(
+            filename)
+
+        pending_ranges = [
+            first_id
+            for first_id in range(self.METADATA_DOCUMENT_ID + 1,
+                                  last_document_id + 1, range_size)
+            if first_id not in completed_ranges
+        ]
 
+        with ThreadPoolExecutor(max_workers=self.parallelism) as range_pool:
+            range_threads = [
+                range_pool.submit(self.range_checkpoint_converter, filename,
+                                  fields_dictionary, first_id,
+                                  first_id + range_size, categories)
+                for first_id in pending_ranges
+            ]
+            for range_thread in range_threads:
+                range_thread.result()
+
+        end_conversion_time = time.time()
+        self.metadata_handler.update_conversion_time(
+            filename, self.ENGINE,
+            end_conversion_time - start_conversion_time,
+            self.database_connector.estimated_count(filename) - 1, resumed)
+
+        self.metadata_handler.add_fields(
+            filename,
+            [self.category_code_field(field) for field in categories])
+        self.metadata_handler.remove_checkpoint(filename)
+        self.metadata_handler.increment_version(filename)
         self.metadata_handler.update_finished_flag(filename, True)
+
+    def range_checkpoint_converter(self, filename, fields_dictionary,
+                                   first_id, last_id, categories):
+        conversion_errors = self.range_converter(
+            filename, fields_dictionary, first_id, last_id, categories)
+        self.metadata_handler.complete_range(filename, first_id,
+                                             conversion_errors)
+
+
+class DatabaseDataType(DataType):
+    ENGINE = "database"
+
+    def range_converter(self, filename, fields_dictionary, first_id,
+                        last_id, categories):
+        new_values = {}
+        number_fields = []
+        for field, field_type in fields_dictionary.items():
+            if field_type == self.STRING_TYPE:
+                new_values[field] = self.string_expression(field)
+            elif field_type == self.NUMBER_TYPE:
+                new_values[field] = self.number_expression(field)
+                number_fields.append(field)
+
+        range_query = {
+            self.DOCUMENT_ID_NAME: {"$gte": first_id, "$lt": last_id}}
+        conversion_errors = self.number_errors(filename, number_fields,
+                                               range_query)
+        pipeline = [{"$set": new_values}]
+
+        self.database_connector.update_many_with_pipeline(
+            filename, pipeline, range_query)
+
+        return conversion_errors
+
+    def number_errors(self, filename, fields, range_query):
+        if not fields:
+            return {}
+
+        field_errors = [
+            {"$cond": [self.number_error_expression(field), 1, 0]}
+            for field in fields
+        ]
+        errors_pipeline = [
+            {"$match": range_query},
+            {"$group": {"_id": None,
+                        "errors": {"$sum": {"$add": field_errors}}}},
+        ]
+
+        errors_result = self.database_connector.aggregate(
+            filename, errors_pipeline)
+        if not errors_result:
+            return {self.NUMBER_TYPE: 0}
+
+        return {self.NUMBER_TYPE: errors_result[0]["errors"]}
+
+    def number_error_expression(self, field):
+        field_value = "$" + field
+
+        return {
+            "$and": [
+                {"$ne": [{"$ifNull": [field_value, None]}, None]},
+                {"$ne": [field_value, ""]},
+                {"$eq": [self.double_expression(field), None]},
+            ]
+        }
+
+    def double_expression(self, field):
+        field_value = "$" + field
+
+        return {"$convert": {
+            "input": field_value,
+            "to": "double",
+            "onError": None,
+            "onNull": None}}
+
+    def string_expression(self, field):
+        field_value = "$" + field
+
+        return {"$toString": {"$ifNull": [field_value, ""]}}
+
+    def number_expression(self, field):
+        field_value = "$" + field
+
+        double_value = {
+            "$cond": [
+                {"$eq": [field_value, ""]},
+                None,
+                self.double_expression(field)
+            ]
+        }
+        is_integer = {
+            "$and": [
+                {"$eq": [{"$type": "$$number"}, "double"]},
+                {"$ne": ["$$number", float("nan")]},
+                {"$lt": [{"$abs": "$$number"}, self.MAX_INTEGER_VALUE]},
+                {"$eq": [{"$trunc": "$$number"}, "$$number"]},
+            ]
+        }
+
+        return {
+            "$let": {
+                "vars": {"number": double_value},
+                "in": {"$cond": [is_integer,
+                                 {"$toLong": "$$number"},
+                                 "$$number"]}
+            }
+        }
@@ -0,0 +1,107 @@
+import pandas as pd
+from data_type_update import DataType
+
+
+class SchemaInference:
+    METADATA_DOCUMENT_ID = 0
+    DOCUMENT_ID_NAME = "_id"
+    SAMPLE_SIZE = 1000
+    MAX_FAILURE_RATE = 0.05
+    MAX_CATEGORIES = 50
+    MAX_CATEGORY_RATIO = 0.5
+    PARSED_TYPES = [
+        DataType.BOOLEAN_TYPE,
+        DataType.INTEGER_TYPE,
+        DataType.NUMBER_TYPE,
+    ]
+    DATETIME_FORMATS = [
+        "%Y-%m-%d",
+        "%Y-%m-%d %H:%M:%S",
+        "%Y-%m-%dT%H:%M:%S",
+        "%Y/%m/%d",
+        "%d/%m/%Y",
+        "%m/%d/%Y",
+        "%d-%m-%Y",
+        "%d/%m/%Y %H:%M",
+        "%m/%d/%Y %H:%M",
+        "%d.%m.%Y",
+    ]
+
+    def __init__(self, database_connector, data_type_converter: DataType):
+        self.database_connector = database_connector
+        self.data_type_converter = data_type_converter
+
+    def infer(self, filename, fields):
+        sample = [
+            document for document in
+            self.database_connector.sample(filename, self.SAMPLE_SIZE + 1)
+            if document[self.DOCUMENT_ID_NAME] != self.METADATA_DOCUMENT_ID
+        ][:self.SAMPLE_SIZE]
+
+        inferred_types = {}
+        for field in fields:
+            values = pd.Series(
+                [document.get(field) for document in sample], dtype=object)
+            inferred_types[field] = self.field_type_inference(values)
+
+        return {
+            "sampleSize": len(sample),
+            "fields": inferred_types,
+        }
+
+    def field_type_inference(self, values):
+        valid_values = values.notna() & (values != "")
+        valid_values_count = int(valid_values.sum())
+        null_rate = self.rate(len(values) - valid_values_count, len(values))
+
+        if valid_values_count == 0:
+            return self.inferred_type(DataType.STRING_TYPE, 0.0, 0.0,
+                                      null_rate)
+
+        valid_values = values[valid_values].reset_index(drop=True)
+
+        for type_name in self.PARSED_TYPES:
+            type_converter = \
+                self.data_type_converter.type_converter_switcher[type_name]
+            _, errors = type_converter(valid_values, None, None, None)
+            failure_rate = self.rate(errors, valid_values_count)
+
+            if failure_rate <= self.MAX_FAILURE_RATE:
+                return self.inferred_type(type_name, 1 - failure_rate,
+                                          failure_rate, null_rate)
+
+        for datetime_format in self.DATETIME_FORMATS:
+            _, errors = self.data_type_converter.datetime_converter(
+                valid_values, None, datetime_format, None)
+            failure_rate = self.rate(errors, valid_values_count)
+
+            if failure_rate <= self.MAX_FAILURE_RATE:
+                inferred_type = self.inferred_type(
+                    DataType.DATETIME_TYPE, 1 - failure_rate, failure_rate,
+                    null_rate)
+                inferred_type["format"] = datetime_format
+                return inferred_type
+
+        distinct_values_count = valid_values.astype(str).nunique()
+        category_ratio = self.rate(distinct_values_count, valid_values_count)
+        if distinct_values_count <= self.MAX_CATEGORIES and \
+                category_ratio <= self.MAX_CATEGORY_RATIO:
+            return self.inferred_type(DataType.CATEGORY_TYPE,
+                                      1 - category_ratio, 0.0, null_rate)
+
+        return self.inferred_type(DataType.STRING_TYPE, 1.0, 0.0, null_rate)
+
+    @staticmethod
+    def rate(count, total):
+        if total == 0:
+            return 0.0
+        return count / total
+
+    @staticmethod
+    def inferred_type(type_name, confidence, failure_rate, null_rate):
+        return {
+            "type": type_name,
+            "confidence": round(confidence, 4),
+            "failureRate": round(failure_rate, 4),
+            "nullRate": round(null_rate, 4),
+        }
@@ -1,6 +1,7 @@
 from flask import jsonify, Flask, request
 import os
-from data_type_update import DataType
+from data_type_update import DataType, DatabaseDataType
+from schema_inference import SchemaInference
 from utils import Database, UserRequest, Metadata
 
 HTTP_STATUS_CODE_SUCCESS = 200
@@ -15,6 +16,11 @@ MESSAGE_RESULT = "result"
 
 FILENAME_NAME = "datasetName"
 FIELD_TYPES_NAMES = "types"
+ENGINE_NAME = "engine"
+ENGINE_FALLBACK_NAME = "engineFallback"
+DEFAULT_ENGINE = "python"
+PARALLELISM_NAME = "parallelism"
+FIELDS_NAME = "fields"
 PARENT_FILENAME_NAME = "inputDatasetName"
 FIRST_ARGUMENT = 0
 
@@ -41,27 +47,82 @@ metadata_handler = Metadata(database)
 def change_data_type():
     parent_filename = request.json[PARENT_FILENAME_NAME]
     field_types_names = request.json[FIELD_TYPES_NAMES]
+    engine = request.json.get(ENGINE_NAME, DEFAULT_ENGINE)
+    parallelism = request.json.get(PARALLELISM_NAME,
+                                   DataType.DEFAULT_PARALLELISM)
 
     request_errors = analyse_request_errors(
         request_validator,
         parent_filename,
-        field_types_names)
+        field_types_names,
+        engine,
+        parallelism)
 
     if request_errors is not None:
         return request_errors
 
-    data_type_converter = DataType(database, metadata_handler)
+    requested_engine = engine
+    engine, engine_fallback = request_validator.engine_fallback(engine)
+    metadata_handler.update_engine_fallback(
+        parent_filename, requested_engine, engine, engine_fallback)
+
+    data_type_converter = create_data_type_converter(engine, parallelism)
     data_type_converter.convert_existent_file(
         parent_filename, field_types_names)
 
     return jsonify({
         MESSAGE_RESULT: f'{MICROSERVICE_URI_GET}{parent_filename}'
-                        f'{MICROSERVICE_URI_GET_PARAMS}'}),\
+                        f'{MICROSERVICE_URI_GET_PARAMS}',
+        ENGINE_NAME: engine,
+        ENGINE_FALLBACK_NAME: engine_fallback}),\
            HTTP_STATUS_CODE_SUCCESS
 
 
+@app.route('/fieldTypes/<filename>/infer', methods=["GET"])
+def infer_data_type(filename):
+    try:
+        request_validator.filename_validator(filename)
+    except Exception as invalid_filename:
+        return jsonify(
+            {MESSAGE_RESULT: invalid_filename.args[FIRST_ARGUMENT]}), \
+               HTTP_STATUS_CODE_NOT_ACCEPTABLE
+
+    try:
+        request_validator.metadata_fields_validator(filename)
+    except Exception as missing_fields:
+        return jsonify(
+            {MESSAGE_RESULT: missing_fields.args[FIRST_ARGUMENT]}), \
+               HTTP_STATUS_CODE_NOT_ACCEPTABLE
+
+    filename_metadata = metadata_handler.read_metadata(filename)
+
+    schema_inference = SchemaInference(
+        database, DataType(database, metadata_handler))
+    inferred_schema = schema_inference.infer(
+        filename, filename_metadata[FIELDS_NAME])
+
+    return jsonify({MESSAGE_RESULT: inferred_schema}), \
+           HTTP_STATUS_CODE_SUCCESS
+
+
+def create_data_type_converter(engine, parallelism):
+    if engine == DatabaseDataType.ENGINE:
+        return DatabaseDataType(database, metadata_handler, parallelism)
+    else:
+        return DataType(database, metadata_handler, parallelism)
+
+
+def resume_interrupted_conversions():
+    interrupted_conversions = metadata_handler.read_interrupted_conversions()
+
+    for filename, checkpoint in interrupted_conversions.items():
+        data_type_converter = create_data_type_converter(
+            checkpoint[ENGINE_NAME], checkpoint[PARALLELISM_NAME])
+        data_type_converter.resume_existent_file(filename, checkpoint)
+
+
 def analyse_request_errors(request_validator, parent_filename,
-                           field_types_names):
+                           field_types_names, engine, parallelism):
     try:
         request_validator.filename_validator(parent_filename)
     except Exception as invalid_filename:
@@ -77,6 +138,20 @@ def analyse_request_errors(request_validator, parent_filename,
             {MESSAGE_RESULT: invalid_fields.args[FIRST_ARGUMENT]}), \
                HTTP_STATUS_CODE_NOT_ACCEPTABLE
 
+    try:
+        request_validator.engine_validator(engine, field_types_names)
+    except Exception as invalid_engine:
+        return jsonify(
+            {MESSAGE_RESULT: invalid_engine.args[FIRST_ARGUMENT]}), \
+               HTTP_STATUS_CODE_NOT_ACCEPTABLE
+
+    try:
+        request_validator.parallelism_validator(parallelism)
+    except Exception as invalid_parallelism:
+        return jsonify(
+            {MESSAGE_RESULT: invalid_parallelism.args[FIRST_ARGUMENT]}), \
+               HTTP_STATUS_CODE_NOT_ACCEPTABLE
+
     try:
         request_validator.finished_processing_validator(parent_filename)
     except Exception as unfinished_filename:
@@ -88,5 +163,6 @@ def analyse_request_errors(request_validator, parent_filename,
 
 
 if __name__ == "__main__":
+    resume_interrupted_conversions()
     app.run(host=os.environ[DATA_TYPE_HANDLER_HOST],
             port=int(os.environ[DATA_TYPE_HANDLER_PORT]))
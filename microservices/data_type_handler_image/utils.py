@@ -1,4 +1,4 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, DESCENDING
 from datetime import datetime
 import pytz
 
@@ -30,6 +30,141 @@ class Metadata:
         self.database_connector.update_one(filename, metadata_new_value,
                                            metadata_query)
 
+    def create_checkpoint(self, filename, fields, engine, parallelism,
+                          range_size):
+        metadata_new_value = {
+            "conversionCheckpoint": {
+                "fields": fields,
+                "engine": engine,
+                "parallelism": parallelism,
+                "rangeSize": range_size,
+                "completedRanges": [],
+            },
+            "conversionErrors": {},
+        }
+        metadata_query = {
+            "_id": 0
+        }
+        self.database_connector.update_one(filename, metadata_new_value,
+                                           metadata_query)
+
+    def read_metadata(self, filename):
+        metadata_query = {
+            "_id": 0
+        }
+        return self.database_connector.find_one(filename, metadata_query)
+
+    def read_checkpoint(self, filename):
+        return self.read_metadata(filename).get("conversionCheckpoint")
+
+    def read_interrupted_conversions(self):
+        checkpoint_query = {
+            "_id": 0,
+            "conversionCheckpoint": {"$exists": True}
+        }
+        interrupted_conversions = {}
+        for filename in self.database_connector.get_filenames():
+            metadata = self.database_connector.find_one(filename,
+                                                        checkpoint_query)
+            if metadata is not None:
+                interrupted_conversions[filename] = \
+                    metadata["conversionCheckpoint"]
+
+        return interrupted_conversions
+
+    def complete_range(self, filename, first_id, conversion_errors):
+        metadata_query = {
+            "_id": 0
+        }
+        metadata_new_value = {
+            "$addToSet": {"conversionCheckpoint.completedRanges": first_id},
+            "$inc": {
+                f'conversionErrors.{type_name}': errors
+                for type_name, errors in conversion_errors.items()
+            }
+        }
+        self.database_connector.update_one_with_operators(
+            filename, metadata_new_value, metadata_query)
+
+    def update_categories(self, filename, categories):
+        metadata_new_value = {
+            "conversionCheckpoint.categories": categories,
+        }
+        for field, field_categories in categories.items():
+            metadata_new_value[f'categories.{field}'] = field_categories
+
+        metadata_query = {
+            "_id": 0
+        }
+        self.database_connector.update_one(filename, metadata_new_value,
+                                           metadata_query)
+
+    def add_fields(self, filename, fields):
+        if not fields:
+            return
+
+        metadata_new_value = {
+            "$addToSet": {"fields": {"$each": fields}}
+        }
+        metadata_query = {
+            "_id": 0
+        }
+        self.database_connector.update_one_with_operators(
+            filename, metadata_new_value, metadata_query)
+
+    def remove_checkpoint(self, filename):
+        metadata_query = {
+            "_id": 0
+        }
+        self.database_connector.unset(filename, "conversionCheckpoint",
+                                      metadata_query)
+
+    def increment_version(self, filename):
+        metadata_new_value = {
+            "$inc": {"version": 1}
+        }
+        metadata_query = {
+            "_id": 0
+        }
+        self.database_connector.update_one_with_operators(
+            filename, metadata_new_value, metadata_query)
+
+    def update_conversion_time(self, filename, engine, conversion_time,
+                               documents_count, resumed):
+        conversion_benchmark = {
+            "engine": engine,
+            "conversionTime": conversion_time,
+            "documents": documents_count,
+            "documentsPerSecond":
+                documents_count / conversion_time if conversion_time else None,
+            "resumed": resumed,
+        }
+        metadata_new_value = {
+            "$set": {
+                "conversionEngine": engine,
+                "conversionTime": conversion_time,
+            },
+            "$push": {"conversionBenchmarks": conversion_benchmark},
+        }
+        metadata_query = {
+            "_id": 0
+        }
+        self.database_connector.update_one_with_operators(
+            filename, metadata_new_value, metadata_query)
+
+    def update_engine_fallback(self, filename, requested_engine, engine,
+                               fallback_reason):
+        metadata_new_value = {
+            "requestedConversionEngine": requested_engine,
+            "conversionEngine": engine,
+            "conversionEngineFallback": fallback_reason,
+        }
+        metadata_query = {
+            "_id": 0
+        }
+        self.database_connector.update_one(filename, metadata_new_value,
+                                           metadata_query)
+
 
 class Database:
     def __init__(self, database_url, replica_set, database_port, database_name):
@@ -37,9 +172,22 @@ class Database:
             f'{database_url}/?replicaSet={replica_set}', int(database_port))
         self.database = self.mongo_client[database_name]
 
-    def find(self, filename, query):
+    def find(self, filename, query, projection=None):
         file_collection = self.database[filename]
-        return file_collection.find(query)
+        return file_collection.find(query, projection)
+
+    def estimated_count(self, filename):
+        file_collection = self.database[filename]
+        return file_collection.estimated_document_count()
+
+    def find_last_document_id(self, filename):
+        file_collection = self.database[filename]
+        last_document = file_collection.find_one(
+            {}, {"_id": True}, sort=[("_id", DESCENDING)])
+
+        if last_document is None:
+            return 0
+        return last_document["_id"]
 
     def get_filenames(self):
         return self.database.list_collection_names()
@@ -49,10 +197,57 @@ class Database:
         file_collection = self.database[filename]
         file_collection.update_one(query, new_values_query)
 
+    def update_many_by_id(self, filename, documents_values):
+        if not documents_values:
+            return
+
+        file_collection = self.database[filename]
+        file_collection.bulk_write(
+            [UpdateOne({"_id": document_id}, {"$set": new_value})
+             for document_id, new_value in documents_values],
+            ordered=False)
+
+    def update_one_with_operators(self, filename, new_value, query):
+        new_value = {
+            operator: values for operator, values in new_value.items()
+            if values
+        }
+        file_collection = self.database[filename]
+        file_collection.update_one(query, new_value)
+
+    def sample(self, filename, size):
+        file_collection = self.database[filename]
+        pipeline = [{"$sample": {"size": size}}]
+        return list(file_collection.aggregate(pipeline))
+
+    def distinct_values(self, filename, field):
+        file_collection = self.database[filename]
+        pipeline = [
+            {"$match": {"_id": {"$ne": 0}}},
+            {"$group": {"_id": "$" + field}},
+        ]
+        return [document["_id"] for document in
+                file_collection.aggregate(pipeline, allowDiskUse=True)]
+
+    def unset(self, filename, field, query):
+        file_collection = self.database[filename]
+        file_collection.update_one(query, {"$unset": {field: ""}})
+
+    def aggregate(self, filename, pipeline):
+        file_collection = self.database[filename]
+        return list(file_collection.aggregate(pipeline))
+
+    def update_many_with_pipeline(self, filename, pipeline, query):
+        file_collection = self.database[filename]
+        file_collection.update_many(query, pipeline)
+
     def find_one(self, filename, query):
         file_collection = self.database[filename]
         return file_collection.find_one(query)
 
+    def server_version(self):
+        return tuple(self.mongo_client.server_info()["versionArray"])
+
     def insert_one_in_file(self, filename, json_object):
         file_collection = self.database[filename]
         file_collection.insert_one(json_object)
@@ -63,8 +258,22 @@ class UserRequest:
     MESSAGE_INVALID_FILENAME = "invalid dataset name"
     MESSAGE_MISSING_FIELDS = "missing fields"
     MESSAGE_UNFINISHED_PROCESSING = "unfinished processing in input dataset"
+    MESSAGE_INVALID_ENGINE = "invalid engine"
+    MESSAGE_ENGINE_FALLBACK = "database engine requires MongoDB 4.2 or " \
+                              "newer, converted with the python engine"
+    MESSAGE_INVALID_PARALLELISM = "invalid parallelism"
+    MESSAGE_INVALID_ENGINE_FIELDS = "database engine only converts " \
+                                    "string and number fields"
     STRING_TYPE = "string"
     NUMBER_TYPE = "number"
+    DATETIME_TYPE = "datetime"
+    FIELD_TYPES = ["string", "number", "integer", "float32", "boolean",
+                   "datetime", "category"]
+    TYPE_NAME = "type"
+    FORMAT_NAME = "format"
+    PYTHON_ENGINE = "python"
+    DATABASE_ENGINE = "database"
+    DATABASE_ENGINE_MINIMUM_VERSION = (4, 2)
 
     def __init__(self, database_connector):
         self.database = database_connector
@@ -94,9 +303,53 @@ class UserRequest:
                                                    filename_metadata_query)
 
         for field in fields:
-            if field not in filename_metadata["fields"]:
+            if field not in filename_metadata.get("fields", []):
                 raise Exception(self.MESSAGE_INVALID_FIELDS)
 
-            if fields[field] != self.NUMBER_TYPE and \
-                    fields[field] != self.STRING_TYPE:
+            if not self.field_type_validator(fields[field]):
                 raise Exception(self.MESSAGE_INVALID_FIELDS)
+
+    def metadata_fields_validator(self, filename):
+        filename_metadata_query = {"datasetName": filename}
+
+        filename_metadata = self.database.find_one(filename,
+                                                   filename_metadata_query)
+
+        if filename_metadata is None or not filename_metadata.get("fields"):
+            raise Exception(self.MESSAGE_MISSING_FIELDS)
+
+    def field_type_validator(self, field_type):
+        if type(field_type) == str:
+            return field_type in self.FIELD_TYPES
+
+        if type(field_type) != dict or \
+                field_type.get(self.TYPE_NAME) != self.DATETIME_TYPE:
+            return False
+
+        return set(field_type.keys()) <= {self.TYPE_NAME,
+                                          self.FORMAT_NAME} and \
+            type(field_type.get(self.FORMAT_NAME, "")) == str
+
+    def engine_validator(self, engine, fields):
+        if engine != self.PYTHON_ENGINE and engine != self.DATABASE_ENGINE:
+            raise Exception(self.MESSAGE_INVALID_ENGINE)
+
+        if engine != self.DATABASE_ENGINE:
+            return
+
+        for field_type in fields.values():
+            if field_type != self.NUMBER_TYPE and \
+                    field_type != self.STRING_TYPE:
+                raise Exception(self.MESSAGE_INVALID_ENGINE_FIELDS)
+
+    def engine_fallback(self, engine):
+        if engine == self.DATABASE_ENGINE and \
+                self.database.server_version()[:2] < \
+                self.DATABASE_ENGINE_MINIMUM_VERSION:
+            return self.PYTHON_ENGINE, self.MESSAGE_ENGINE_FALLBACK
+
+        return engine, None
+
+    def parallelism_validator(self, parallelism):
+        if type(parallelism) != int or parallelism < 1:
+            raise Exception(self.MESSAGE_INVALID_PARALLELISM)
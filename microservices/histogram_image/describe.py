@@ -0,0 +1,199 @@
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import DESCENDING
+from bson.decimal128 import Decimal128
+import math
+from sketch import Moments, CoMoments, TDigest
+
+
+def numeric_value(value):
+    if isinstance(value, Decimal128):
+        decimal_value = value.to_decimal()
+        if not decimal_value.is_finite():
+            return None
+        return float(decimal_value)
+
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or \
+            not math.isfinite(value):
+        return None
+
+    return value
+
+
+class FieldDescription:
+    def __init__(self):
+        self.count = 0
+        self.null_count = 0
+        self.moments = Moments()
+        self.digest = TDigest()
+
+    def update(self, value):
+        if value is None or value == "":
+            self.null_count += 1
+            return
+
+        self.count += 1
+        number = numeric_value(value)
+        if number is not None:
+            self.moments.update(number)
+            self.digest.update(number)
+
+    def merge(self, other):
+        self.count += other.count
+        self.null_count += other.null_count
+        self.moments.merge(other.moments)
+        self.digest.merge(other.digest)
+
+    def describe(self, quantiles):
+        variance = self.moments.variance()
+
+        return {
+            "count": self.count,
+            "nullCount": self.null_count,
+            "numericCount": self.moments.count,
+            "mean": self.moments.mean if self.moments.count else None,
+            "std": math.sqrt(variance) if variance is not None else None,
+            "min": self.moments.minimum,
+            "max": self.moments.maximum,
+            "quantiles": [
+                {"quantile": quantile,
+                 "value": self.digest.quantile(quantile)}
+                for quantile in quantiles
+            ],
+        }
+
+
+class Describe:
+    METADATA_DOCUMENT_ID = 0
+    DOCUMENT_ID_NAME = "_id"
+    CORRELATION_NAME = "correlation"
+    CHUNK_SIZE = 50000
+    CHUNK_THREADS = 4
+    QUANTILES = [0.25, 0.5, 0.75]
+
+    def __init__(self, database_connector, metadata_handler):
+        self.database_connector = database_connector
+        self.metadata_handler = metadata_handler
+        self.thread_pool = ThreadPoolExecutor()
+        self.chunk_pool = ThreadPoolExecutor(max_workers=self.CHUNK_THREADS)
+
+    def create_file(self, parent_filename, describe_filename, fields,
+                    correlation=False):
+        self.metadata_handler.create_describe_file(
+            parent_filename,
+            describe_filename,
+            fields,
+            correlation)
+
+        self.thread_pool.submit(
+            self.file_processing,
+            parent_filename,
+            describe_filename,
+            fields,
+            correlation)
+
+    def file_processing(self, parent_filename, describe_filename, fields,
+                        correlation):
+        last_document = self.database_connector.find_one(
+            parent_filename, {}, [(self.DOCUMENT_ID_NAME, DESCENDING)])
+        last_document_id = last_document[self.DOCUMENT_ID_NAME]
+
+        chunk_threads = [
+            self.chunk_pool.submit(
+                self.chunk_aggregate,
+                parent_filename,
+                fields,
+                correlation,
+                chunk_query)
+            for chunk_query in self.chunks_queries(last_document_id)
+        ]
+
+        fields_description = {field: FieldDescription() for field in fields}
+        fields_pairs = self.fields_pairs(fields, correlation)
+        for chunk_thread in chunk_threads:
+            chunk_description, chunk_pairs = chunk_thread.result()
+            for field in fields:
+                fields_description[field].merge(chunk_description[field])
+            for pair in fields_pairs:
+                fields_pairs[pair].merge(chunk_pairs[pair])
+
+        describe_documents = []
+        document_id = 1
+        for field in fields:
+            describe_documents.append({
+                self.DOCUMENT_ID_NAME: document_id,
+                field: fields_description[field].describe(self.QUANTILES),
+            })
+            document_id += 1
+
+        if correlation:
+            describe_documents.append({
+                self.DOCUMENT_ID_NAME: document_id,
+                self.CORRELATION_NAME: self.correlation_matrix(
+                    fields, fields_pairs),
+            })
+
+        self.database_connector.insert_many_in_file(describe_filename,
+                                                    describe_documents)
+
+        self.metadata_handler.update_finish_flag(describe_filename, True)
+
+    def chunks_queries(self, last_document_id):
+        if isinstance(last_document_id, bool) or \
+                not isinstance(last_document_id, int):
+            return [{self.DOCUMENT_ID_NAME: {
+                "$ne": self.METADATA_DOCUMENT_ID}}]
+
+        return [
+            {self.DOCUMENT_ID_NAME: {
+                "$gt": first_document_id,
+                "$lte": first_document_id + self.CHUNK_SIZE}}
+            for first_document_id in range(
+                self.METADATA_DOCUMENT_ID, last_document_id, self.CHUNK_SIZE)
+        ]
+
+    def chunk_aggregate(self, parent_filename, fields, correlation,
+                        chunk_query):
+        documents = self.database_connector.find(
+            parent_filename, chunk_query, {field: True for field in fields})
+
+        chunk_description = {field: FieldDescription() for field in fields}
+        chunk_pairs = self.fields_pairs(fields, correlation)
+        for document in documents:
+            for field in fields:
+                chunk_description[field].update(document.get(field))
+
+            for first_field, second_field in chunk_pairs:
+                first_value = numeric_value(document.get(first_field))
+                second_value = numeric_value(document.get(second_field))
+                if first_value is not None and second_value is not None:
+                    chunk_pairs[(first_field, second_field)].update(
+                        first_value, second_value)
+
+        return chunk_description, chunk_pairs
+
+    def fields_pairs(self, fields, correlation):
+        if not correlation:
+            return {}
+
+        return {
+            (first_field, second_field): CoMoments()
+            for first_index, first_field in enumerate(fields)
+            for second_field in fields[first_index + 1:]
+        }
+
+    def correlation_matrix(self, fields, fields_pairs):
+        matrix = []
+        for first_index, first_field in enumerate(fields):
+            row = []
+            for second_index, second_field in enumerate(fields):
+                if first_index == second_index:
+                    row.append(1.0)
+                elif first_index < second_index:
+                    row.append(fields_pairs[
+                        (first_field, second_field)].correlation())
+                else:
+                    row.append(fields_pairs[
+                        (second_field, first_field)].correlation())
+            matrix.append(row)
+
+        return {"fields": fields, "matrix": matrix}
@@ -1,44 +1,455 @@
 from concurrent.futures import ThreadPoolExecutor
+from pymongo.errors import OperationFailure
+from sketch import FieldSketch
 
 
 class Histogram:
     METADATA_DOCUMENT_ID = 0
     DOCUMENT_ID_NAME = "_id"
+    MODE_NAME = "mode"
+    WIDTH_NAME = "width"
+    COUNT_NAME = "count"
+    WIDTH_MODE = "width"
+    COUNT_MODE = "count"
+    QUANTILE_MODE = "quantile"
+    CATEGORICAL_MODE = "categorical"
+    APPROXIMATE_MODE = "approximate"
+    CATEGORICAL_BINS = {MODE_NAME: CATEGORICAL_MODE}
+    SAMPLE_SIZE_NAME = "sampleSize"
+    LAST_DOCUMENT_ID_NAME = "lastDocumentId"
+    DATASET_VERSION_NAME = "datasetVersion"
+    MERGEABLE_MODES = [CATEGORICAL_MODE, WIDTH_MODE]
+    SKETCH_NAME = "sketch"
+    SAMPLE_SCALE_NAME = "sampleScale"
+    DEFAULT_APPROXIMATE_BINS = 10
+    DEFAULT_APPROXIMATE_TOP = 10
+    DEFAULT_SAMPLE_SIZE = 100000
 
-    def __init__(self, database_connector, metadata_handler):
+    def __init__(self, database_connector, metadata_handler, result_cache):
         self.database_connector = database_connector
         self.metadata_handler = metadata_handler
+        self.result_cache = result_cache
         self.thread_pool = ThreadPoolExecutor()
 
-    def create_file(self, parent_filename, histogram_filename, fields):
+    def create_file(self, parent_filename, histogram_filename, fields,
+                    bins, approximate=False, sample_size=None):
         self.metadata_handler.create_file(
             parent_filename,
             histogram_filename,
-            fields)
+            fields,
+            bins,
+            approximate,
+            sample_size)
 
-        self.thread_pool.submit(
-            self.file_processing,
-            parent_filename,
-            histogram_filename,
-            fields)
+        if approximate:
+            self.thread_pool.submit(
+                self.approximate_file_processing,
+                parent_filename,
+                histogram_filename,
+                fields,
+                sample_size)
+        else:
+            self.thread_pool.submit(
+                self.file_processing,
+                parent_filename,
+                histogram_filename,
+                fields,
+                bins)
+
+    def file_processing(self, parent_filename, histogram_filename, fields,
+                        bins):
+        fields_mode = {
+            field: bins.get(field, self.CATEGORICAL_BINS) for field in fields
+        }
+
+        self.cached_file_processing(parent_filename, histogram_filename,
+                                    fields, fields_mode,
+                                    self.fields_documents, bins)
+
+    def approximate_file_processing(self, parent_filename,
+                                    histogram_filename, fields, sample_size):
+        fields_mode = {
+            field: {self.MODE_NAME: self.APPROXIMATE_MODE,
+                    self.SAMPLE_SIZE_NAME: sample_size}
+            for field in fields
+        }
 
-    def file_processing(self, parent_filename, histogram_filename, fields):
+        self.cached_file_processing(parent_filename, histogram_filename,
+                                    fields, fields_mode,
+                                    self.approximate_fields_documents,
+                                    sample_size)
+
+    def cached_file_processing(self, parent_filename, histogram_filename,
+                               fields, fields_mode, fields_documents_builder,
+                               builder_option):
+        dataset_version = self.result_cache.dataset_version(parent_filename)
+        self.result_cache.invalidate(parent_filename, dataset_version)
+
+        fields_document = self.result_cache.read(
+            parent_filename, dataset_version, fields_mode)
+        missing_fields = [
+            field for field in fields_mode if field not in fields_document]
+
+        if missing_fields:
+            missing_fields_document = fields_documents_builder(
+                parent_filename, missing_fields, builder_option)
+            self.result_cache.save(
+                parent_filename, dataset_version,
+                {field: fields_mode[field] for field in missing_fields},
+                missing_fields_document)
+            fields_document.update(missing_fields_document)
+
+        histogram_documents = []
         document_id = 1
+        for field in fields:
+            histogram_document = dict(fields_document[field])
+            histogram_document[self.DOCUMENT_ID_NAME] = document_id
+            histogram_documents.append(histogram_document)
+            document_id += 1
+
+        self.database_connector.insert_many_in_file(histogram_filename,
+                                                    histogram_documents)
+
+        self.metadata_handler.update_dataset_version(histogram_filename,
+                                                     dataset_version)
+        self.metadata_handler.update_finish_flag(histogram_filename, True)
+
+    def refresh_file(self, histogram_filename):
+        self.metadata_handler.update_finish_flag(histogram_filename, False)
+
+        self.thread_pool.submit(self.refresh_processing, histogram_filename)
+
+    def refresh_processing(self, histogram_filename):
+        histogram_metadata = self.metadata_handler.read_metadata(
+            histogram_filename)
+        parent_filename = histogram_metadata["parentDatasetName"]
+        fields = histogram_metadata["fields"]
+        stored_version = histogram_metadata[self.DATASET_VERSION_NAME]
+        watermark = stored_version[self.LAST_DOCUMENT_ID_NAME]
+
+        dataset_version = self.result_cache.dataset_version(parent_filename)
+        if dataset_version == stored_version:
+            self.metadata_handler.update_finish_flag(histogram_filename, True)
+            return
+
+        is_appended = dataset_version[self.LAST_DOCUMENT_ID_NAME] > \
+            watermark and all(
+                stored_version.get(name) == dataset_version[name]
+                for name in dataset_version
+                if name != self.LAST_DOCUMENT_ID_NAME)
+        stored_fields_document = self.histogram_fields_document(
+            histogram_filename, fields)
 
+        if histogram_metadata["approximate"]:
+            fields_mode, fields_document = self.approximate_refresh(
+                parent_filename, fields, histogram_metadata,
+                stored_fields_document, watermark if is_appended else None)
+        else:
+            fields_mode, fields_document = self.exact_refresh(
+                parent_filename, fields, histogram_metadata,
+                stored_fields_document, watermark if is_appended else None)
+
+        self.result_cache.invalidate(parent_filename, dataset_version)
+        self.result_cache.save(parent_filename, dataset_version, fields_mode,
+                               fields_document)
+
+        histogram_documents = []
+        document_id = 1
         for field in fields:
-            field_accumulator = "$" + field
-            print(field_accumulator, flush=True)
-            pipeline = [
-                {"$group": {"_id": field_accumulator, "count": {"$sum": 1}}}]
-
-            field_result = {
-                field: self.database_connector.aggregate(parent_filename,
-                                                         pipeline),
-                self.DOCUMENT_ID_NAME: document_id,
-            }
+            histogram_document = dict(fields_document[field])
+            histogram_document[self.DOCUMENT_ID_NAME] = document_id
+            histogram_documents.append(histogram_document)
             document_id += 1
 
-            self.database_connector.insert_one_in_file(histogram_filename,
-                                                       field_result)
+        self.database_connector.upsert_many_in_file(histogram_filename,
+                                                    histogram_documents)
 
+        self.metadata_handler.update_dataset_version(histogram_filename,
+                                                     dataset_version)
         self.metadata_handler.update_finish_flag(histogram_filename, True)
+
+    def histogram_fields_document(self, histogram_filename, fields):
+        histogram_documents = self.database_connector.find(
+            histogram_filename,
+            {self.DOCUMENT_ID_NAME: {"$ne": self.METADATA_DOCUMENT_ID}})
+
+        fields_document = {}
+        for histogram_document in histogram_documents:
+            field = fields[histogram_document.pop(self.DOCUMENT_ID_NAME) - 1]
+            fields_document[field] = histogram_document
+
+        return fields_document
+
+    def exact_refresh(self, parent_filename, fields, histogram_metadata,
+                      stored_fields_document, watermark):
+        bins = histogram_metadata["bins"]
+        fields_mode = {
+            field: bins.get(field, self.CATEGORICAL_BINS) for field in fields
+        }
+
+        mergeable_fields = []
+        if watermark is not None:
+            mergeable_fields = [
+                field for field, mode in fields_mode.items()
+                if mode[self.MODE_NAME] in self.MERGEABLE_MODES
+            ]
+        recomputed_fields = [
+            field for field in fields_mode if field not in mergeable_fields]
+
+        fields_document = {}
+        if mergeable_fields:
+            appended_fields_document = self.fields_documents(
+                parent_filename, mergeable_fields, bins, watermark)
+
+            for field in mergeable_fields:
+                fields_document[field] = {
+                    field: self.merge_counts(
+                        stored_fields_document[field][field],
+                        appended_fields_document[field][field],
+                        fields_mode[field][self.MODE_NAME])
+                }
+
+        if recomputed_fields:
+            fields_document.update(self.fields_documents(
+                parent_filename, recomputed_fields, bins))
+
+        return fields_mode, fields_document
+
+    def approximate_refresh(self, parent_filename, fields,
+                            histogram_metadata, stored_fields_document,
+                            watermark):
+        sample_size = histogram_metadata[self.SAMPLE_SIZE_NAME]
+        fields_mode = {
+            field: {self.MODE_NAME: self.APPROXIMATE_MODE,
+                    self.SAMPLE_SIZE_NAME: sample_size}
+            for field in fields
+        }
+
+        if watermark is None or sample_size is not None:
+            return fields_mode, self.approximate_fields_documents(
+                parent_filename, list(fields_mode), sample_size)
+
+        appended_fields_document = self.approximate_fields_documents(
+            parent_filename, list(fields_mode), None, watermark)
+
+        fields_document = {}
+        for field in fields_mode:
+            field_sketch = FieldSketch.from_dict(
+                stored_fields_document[field][self.SKETCH_NAME])
+            field_sketch.merge(FieldSketch.from_dict(
+                appended_fields_document[field][self.SKETCH_NAME]))
+            fields_document[field] = self.sketch_document(field,
+                                                          field_sketch)
+
+        return fields_mode, fields_document
+
+    def merge_counts(self, stored_counts, appended_counts, mode):
+        merged_counts = {}
+        for count in stored_counts + appended_counts:
+            count_key = repr(count[self.DOCUMENT_ID_NAME])
+            if count_key in merged_counts:
+                merged_counts[count_key]["count"] += count["count"]
+            else:
+                merged_counts[count_key] = dict(count)
+
+        merged_counts = list(merged_counts.values())
+        if mode == self.WIDTH_MODE:
+            merged_counts.sort(
+                key=lambda count: count[self.DOCUMENT_ID_NAME]["min"])
+
+        return merged_counts
+
+    def fields_documents(self, parent_filename, fields, bins,
+                         watermark=None):
+        fields_pipeline = self.fields_pipeline(parent_filename, fields, bins)
+        fields_result = self.fields_aggregation(parent_filename,
+                                                fields_pipeline, watermark)
+
+        return {field: {field: fields_result[field]} for field in fields}
+
+    def approximate_fields_documents(self, parent_filename, fields,
+                                     sample_size, watermark=None):
+        fields_sketch = {field: FieldSketch() for field in fields}
+        sampled_documents = 0
+
+        if sample_size is None:
+            documents = self.database_connector.find(
+                parent_filename,
+                self.documents_filter(watermark)["$match"],
+                {field: True for field in fields})
+        else:
+            documents = self.database_connector.sample(
+                parent_filename, sample_size)
+
+        for document in documents:
+            if document[self.DOCUMENT_ID_NAME] == self.METADATA_DOCUMENT_ID:
+                continue
+
+            sampled_documents += 1
+            for field, field_sketch in fields_sketch.items():
+                field_sketch.update(document.get(field))
+
+        sample_scale = 1
+        if sample_size is not None and sampled_documents:
+            documents_count = self.database_connector.estimated_count(
+                parent_filename) - 1
+            sample_scale = max(documents_count, sampled_documents) / \
+                sampled_documents
+
+        return {
+            field: self.sketch_document(field, field_sketch, sample_scale)
+            for field, field_sketch in fields_sketch.items()
+        }
+
+    def sketch_document(self, field, field_sketch, sample_scale=1):
+        return {
+            field: field_sketch.histogram(self.DEFAULT_APPROXIMATE_BINS,
+                                          self.DEFAULT_APPROXIMATE_TOP,
+                                          sample_scale),
+            self.SKETCH_NAME: field_sketch.to_dict(),
+            self.SAMPLE_SCALE_NAME: sample_scale,
+        }
+
+    def approximate_histogram(self, histogram_filename, bins, top):
+        histogram_metadata = self.metadata_handler.read_metadata(
+            histogram_filename)
+
+        result = {}
+        for field in histogram_metadata["fields"]:
+            sketch_document = self.database_connector.find_one(
+                histogram_filename, {field: {"$exists": True},
+                                     self.SKETCH_NAME: {"$exists": True}})
+            field_sketch = FieldSketch.from_dict(
+                sketch_document[self.SKETCH_NAME])
+            result[field] = field_sketch.histogram(
+                bins, top, sketch_document.get(self.SAMPLE_SCALE_NAME, 1))
+
+        return result
+
+    def documents_filter(self, watermark=None):
+        if watermark is None:
+            return {"$match": {
+                self.DOCUMENT_ID_NAME: {"$ne": self.METADATA_DOCUMENT_ID}}}
+
+        return {"$match": {self.DOCUMENT_ID_NAME: {"$gt": watermark}}}
+
+    def numbers_filter(self, field):
+        return {"$match": {field: {"$type": "number"}}}
+
+    def fields_pipeline(self, parent_filename, fields, bins):
+        count_mode_fields = [
+            field for field in fields
+            if field in bins and
+            bins[field][self.MODE_NAME] == self.COUNT_MODE
+        ]
+        fields_range = self.fields_range(parent_filename, count_mode_fields)
+
+        fields_pipeline = {}
+        for field in fields:
+            if field not in bins:
+                fields_pipeline[field] = self.categorical_pipeline(field)
+                continue
+
+            field_bins = bins[field]
+            if field_bins[self.MODE_NAME] == self.WIDTH_MODE:
+                fields_pipeline[field] = self.binned_pipeline(
+                    field, 0, field_bins[self.WIDTH_NAME])
+
+            elif field_bins[self.MODE_NAME] == self.COUNT_MODE:
+                minimum, maximum = fields_range[field]
+                width = (maximum - minimum) / field_bins[self.COUNT_NAME]
+                fields_pipeline[field] = self.binned_pipeline(
+                    field, minimum, width or 1,
+                    field_bins[self.COUNT_NAME] - 1)
+
+            else:
+                fields_pipeline[field] = self.quantile_pipeline(
+                    field, field_bins[self.COUNT_NAME])
+
+        return fields_pipeline
+
+    def fields_range(self, parent_filename, fields):
+        if not fields:
+            return {}
+
+        range_pipeline = [
+            self.documents_filter(),
+            {"$facet": {
+                field: [
+                    self.numbers_filter(field),
+                    {"$group": {"_id": None,
+                                "min": {"$min": "$" + field},
+                                "max": {"$max": "$" + field}}},
+                ]
+                for field in fields
+            }},
+        ]
+        ranges_result = self.database_connector.aggregate(parent_filename,
+                                                          range_pipeline)[0]
+
+        fields_range = {}
+        for field, field_range in ranges_result.items():
+            if field_range:
+                fields_range[field] = (field_range[0]["min"],
+                                       field_range[0]["max"])
+            else:
+                fields_range[field] = (0, 0)
+
+        return fields_range
+
+    def categorical_pipeline(self, field):
+        field_accumulator = "$" + field
+        return [{"$group": {"_id": field_accumulator, "count": {"$sum": 1}}}]
+
+    def binned_pipeline(self, field, origin, width, last_bin=None):
+        bin_index = {"$floor": {
+            "$divide": [{"$subtract": ["$" + field, origin]}, width]}}
+        if last_bin is not None:
+            bin_index = {"$min": [bin_index, last_bin]}
+
+        lower_bound = {"$add": [origin, {"$multiply": [bin_index, width]}]}
+
+        return [
+            self.numbers_filter(field),
+            {"$group": {"_id": lower_bound, "count": {"$sum": 1}}},
+            {"$sort": {"_id": 1}},
+            {"$project": {
+                "_id": {"min": "$_id", "max": {"$add": ["$_id", width]}},
+                "count": 1}},
+        ]
+
+    def quantile_pipeline(self, field, buckets):
+        return [
+            self.numbers_filter(field),
+            {"$bucketAuto": {"groupBy": "$" + field, "buckets": buckets}},
+        ]
+
+    def fields_aggregation(self, parent_filename, fields_pipeline,
+                           watermark=None):
+        facet_pipeline = [
+            self.documents_filter(watermark),
+            {"$facet": fields_pipeline},
+        ]
+
+        try:
+            return self.database_connector.aggregate(parent_filename,
+                                                     facet_pipeline)[0]
+        except OperationFailure:
+            return self.concurrent_fields_aggregation(parent_filename,
+                                                      fields_pipeline,
+                                                      watermark)
+
+    def concurrent_fields_aggregation(self, parent_filename,
+                                      fields_pipeline, watermark=None):
+        field_threads = {
+            field: self.thread_pool.submit(
+                self.database_connector.aggregate,
+                parent_filename,
+                [self.documents_filter(watermark)] + field_pipeline)
+            for field, field_pipeline in fields_pipeline.items()
+        }
+
+        return {
+            field: field_thread.result()
+            for field, field_thread in field_threads.items()
+        }
@@ -1,8 +1,10 @@
 from flask import jsonify, Flask, request
 import os
 from histogram import Histogram
-from utils import Database, UserRequest, Metadata
+from describe import Describe
+from utils import Database, UserRequest, Metadata, HistogramCache
 
+HTTP_STATUS_CODE_SUCCESS = 200
 HTTP_STATUS_CODE_SUCCESS_CREATED = 201
 HTTP_STATUS_CODE_NOT_ACCEPTABLE = 406
 HTTP_STATUS_CODE_CONFLICT = 409
@@ -13,6 +15,11 @@ HISTOGRAM_PORT = "HISTOGRAM_PORT"
 MESSAGE_RESULT = "result"
 
 FIELDS_NAME = "names"
+BINS_NAME = "bins"
+APPROXIMATE_NAME = "approximate"
+SAMPLE_SIZE_NAME = "sampleSize"
+TOP_NAME = "top"
+CORRELATION_NAME = "correlation"
 HISTOGRAM_FILENAME_NAME = "outputDatasetName"
 PARENT_FILENAME_NAME = "inputDatasetName"
 
@@ -24,8 +31,10 @@ DATABASE_URL = "DATABASE_URL"
 DATABASE_PORT = "DATABASE_PORT"
 DATABASE_NAME = "DATABASE_NAME"
 DATABASE_REPLICA_SET = "DATABASE_REPLICA_SET"
+CACHE_DATABASE_NAME = "HISTOGRAM_CACHE_DATABASE_NAME"
 
 MICROSERVICE_URI_GET = "/api/learningOrchestra/v1/explore/histogram/"
+MICROSERVICE_DESCRIBE_URI_GET = "/api/learningOrchestra/v1/explore/describe/"
 MICROSERVICE_URI_GET_PARAMS = "?query={}&limit=10&skip=0"
 
 app = Flask(__name__)
@@ -38,6 +47,16 @@ database = Database(
 )
 request_validator = UserRequest(database)
 metadata = Metadata(database)
+cache_database = Database(
+    os.environ[DATABASE_URL],
+    os.environ[DATABASE_REPLICA_SET],
+    os.environ[DATABASE_PORT],
+    os.environ.get(CACHE_DATABASE_NAME,
+                   os.environ[DATABASE_NAME] +
+                   HistogramCache.CACHE_DATABASE_SUFFIX),
+)
+histogram_cache = HistogramCache(database, cache_database)
+histogram_cache.drop_legacy_cache()
 
 
 @app.route("/histograms", methods=["POST"])
@@ -45,22 +64,33 @@ def create_histogram():
     parent_filename = request.json[PARENT_FILENAME_NAME]
     histogram_filename = request.json[HISTOGRAM_FILENAME_NAME]
     fields_name = request.json[FIELDS_NAME]
+    bins = request.json.get(BINS_NAME, {})
+    approximate = request.json.get(APPROXIMATE_NAME, False)
+    sample_size = request.json.get(
+        SAMPLE_SIZE_NAME,
+        Histogram.DEFAULT_SAMPLE_SIZE if approximate is True else None)
 
     request_errors = analyse_request_errors(
         request_validator,
         parent_filename,
         histogram_filename,
-        fields_name)
+        fields_name,
+        bins,
+        approximate,
+        sample_size)
 
     if request_errors is not None:
         return request_errors
 
-    histogram = Histogram(database, metadata)
+    histogram = Histogram(database, metadata, histogram_cache)
 
     histogram.create_file(
         parent_filename,
         histogram_filename,
         fields_name,
+        bins,
+        approximate,
+        sample_size,
     )
 
     return (
@@ -72,8 +102,143 @@ def create_histogram():
     )
 
 
+@app.route("/histograms/<histogram_filename>", methods=["PATCH"])
+def refresh_histogram(histogram_filename):
+    try:
+        request_validator.refresh_validator(histogram_filename)
+    except Exception as invalid_histogram:
+        return (
+            jsonify({MESSAGE_RESULT: invalid_histogram.args[
+                FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
+    histogram = Histogram(database, metadata, histogram_cache)
+    histogram.refresh_file(histogram_filename)
+
+    return (
+        jsonify({
+            MESSAGE_RESULT:
+                f'{MICROSERVICE_URI_GET}{histogram_filename}'
+                f'{MICROSERVICE_URI_GET_PARAMS}'}),
+        HTTP_STATUS_CODE_SUCCESS,
+    )
+
+
+@app.route("/histograms/<histogram_filename>/approximate", methods=["GET"])
+def read_approximate_histogram(histogram_filename):
+    try:
+        request_validator.approximate_histogram_validator(histogram_filename)
+    except Exception as invalid_histogram:
+        return (
+            jsonify({MESSAGE_RESULT: invalid_histogram.args[
+                FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
+    bins = request.args.get(BINS_NAME, Histogram.DEFAULT_APPROXIMATE_BINS,
+                            type=int)
+    top = request.args.get(TOP_NAME, Histogram.DEFAULT_APPROXIMATE_TOP,
+                           type=int)
+
+    histogram = Histogram(database, metadata, histogram_cache)
+
+    return (
+        jsonify({
+            MESSAGE_RESULT: histogram.approximate_histogram(
+                histogram_filename, max(bins, 1), max(top, 0))}),
+        HTTP_STATUS_CODE_SUCCESS,
+    )
+
+
+@app.route("/describes", methods=["POST"])
+def create_describe():
+    parent_filename = request.json[PARENT_FILENAME_NAME]
+    describe_filename = request.json[HISTOGRAM_FILENAME_NAME]
+    fields_name = request.json[FIELDS_NAME]
+    correlation = request.json.get(CORRELATION_NAME, False)
+
+    request_errors = analyse_describe_request_errors(
+        request_validator,
+        parent_filename,
+        describe_filename,
+        fields_name,
+        correlation)
+
+    if request_errors is not None:
+        return request_errors
+
+    describe = Describe(database, metadata)
+
+    describe.create_file(
+        parent_filename,
+        describe_filename,
+        fields_name,
+        correlation,
+    )
+
+    return (
+        jsonify({
+            MESSAGE_RESULT:
+                f'{MICROSERVICE_DESCRIBE_URI_GET}{describe_filename}'
+                f'{MICROSERVICE_URI_GET_PARAMS}'}),
+        HTTP_STATUS_CODE_SUCCESS_CREATED,
+    )
+
+
+def analyse_describe_request_errors(request_validator, parent_filename,
+                                    describe_filename, fields_name,
+                                    correlation):
+    try:
+        request_validator.histogram_filename_validator(
+            describe_filename
+        )
+    except Exception as invalid_describe_filename:
+        return (
+            jsonify({MESSAGE_RESULT: invalid_describe_filename.args[
+                FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_CONFLICT,
+        )
+
+    try:
+        request_validator.filename_validator(parent_filename)
+    except Exception as invalid_filename:
+        return (
+            jsonify({MESSAGE_RESULT: invalid_filename.args[FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
+    try:
+        request_validator.fields_validator(parent_filename,
+                                           fields_name)
+    except Exception as invalid_fields:
+        return (
+            jsonify({MESSAGE_RESULT: invalid_fields.args[FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
+    try:
+        request_validator.correlation_validator(correlation)
+    except Exception as invalid_correlation:
+        return (
+            jsonify({MESSAGE_RESULT: invalid_correlation.args[
+                FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
+    try:
+        request_validator.finished_processing_validator(parent_filename)
+    except Exception as unfinished_filename:
+        return jsonify(
+            {MESSAGE_RESULT: unfinished_filename.args[FIRST_ARGUMENT]}), \
+               HTTP_STATUS_CODE_NOT_ACCEPTABLE
+
+    return None
+
+
 def analyse_request_errors(request_validator, parent_filename,
-                           histogram_filename, fields_name):
+                           histogram_filename, fields_name, bins,
+                           approximate, sample_size):
     try:
         request_validator.histogram_filename_validator(
             histogram_filename
@@ -102,6 +267,24 @@ def analyse_request_errors(request_validator, parent_filename,
             HTTP_STATUS_CODE_NOT_ACCEPTABLE,
         )
 
+    try:
+        request_validator.bins_validator(fields_name, bins)
+    except Exception as invalid_bins:
+        return (
+            jsonify({MESSAGE_RESULT: invalid_bins.args[FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
+    try:
+        request_validator.approximate_validator(approximate, sample_size,
+                                                bins)
+    except Exception as invalid_approximate:
+        return (
+            jsonify({MESSAGE_RESULT: invalid_approximate.args[
+                FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
     try:
         request_validator.finished_processing_validator(parent_filename)
     except Exception as unfinished_filename:
@@ -0,0 +1,467 @@
+import hashlib
+import math
+
+
+def value_hash(value):
+    digest = hashlib.md5(
+        f'{type(value).__name__}:{value}'.encode("utf-8")).digest()
+    return (int.from_bytes(digest[:8], "big"),
+            int.from_bytes(digest[8:], "big"))
+
+
+class TDigest:
+    __BUFFER_SIZE = 2000
+
+    def __init__(self, compression=100, centroids=None, count=0,
+                 minimum=None, maximum=None):
+        self.compression = compression
+        self.centroids = centroids if centroids is not None else []
+        self.count = count
+        self.minimum = minimum
+        self.maximum = maximum
+        self.__buffer = []
+
+    def update(self, value):
+        self.__buffer.append(value)
+        self.count += 1
+
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+        if len(self.__buffer) >= self.__BUFFER_SIZE:
+            self.compress()
+
+    def merge(self, other):
+        other.compress()
+        self.compress()
+        self.centroids = self.__merge_centroids(
+            self.centroids + other.centroids)
+        self.count += other.count
+
+        if other.minimum is not None and \
+                (self.minimum is None or other.minimum < self.minimum):
+            self.minimum = other.minimum
+        if other.maximum is not None and \
+                (self.maximum is None or other.maximum > self.maximum):
+            self.maximum = other.maximum
+
+    def compress(self):
+        if not self.__buffer:
+            return
+
+        self.centroids = self.__merge_centroids(
+            self.centroids + [[value, 1] for value in self.__buffer])
+        self.__buffer = []
+
+    def __scale(self, quantile):
+        return self.compression / (2 * math.pi) * \
+               math.asin(2 * min(max(quantile, 0), 1) - 1)
+
+    def __merge_centroids(self, centroids):
+        if not centroids:
+            return []
+
+        centroids.sort(key=lambda centroid: centroid[0])
+        total_weight = sum(centroid[1] for centroid in centroids)
+
+        merged_centroids = []
+        cumulative_weight = 0
+        current_mean, current_weight = centroids[0]
+        for mean, weight in centroids[1:]:
+            proposed_weight = current_weight + weight
+            lower_scale = self.__scale(cumulative_weight / total_weight)
+            upper_scale = self.__scale(
+                (cumulative_weight + proposed_weight) / total_weight)
+
+            if upper_scale - lower_scale <= 1:
+                current_mean += (mean - current_mean) * weight / \
+                                proposed_weight
+                current_weight = proposed_weight
+            else:
+                merged_centroids.append([current_mean, current_weight])
+                cumulative_weight += current_weight
+                current_mean, current_weight = mean, weight
+
+        merged_centroids.append([current_mean, current_weight])
+        return merged_centroids
+
+    def __cdf_points(self):
+        self.compress()
+
+        points = [(self.minimum, 0)]
+        cumulative_weight = 0
+        for mean, weight in self.centroids:
+            points.append((mean, cumulative_weight + weight / 2))
+            cumulative_weight += weight
+        points.append((self.maximum, cumulative_weight))
+
+        return points
+
+    def cdf(self, value):
+        if self.count == 0:
+            return 0.0
+        if value < self.minimum:
+            return 0.0
+        if value >= self.maximum:
+            return 1.0
+
+        points = self.__cdf_points()
+        total_weight = points[-1][1]
+        for (lower_value, lower_weight), (upper_value, upper_weight) in \
+                zip(points, points[1:]):
+            if lower_value <= value < upper_value:
+                position = (value - lower_value) / (upper_value - lower_value)
+                weight = lower_weight + position * (upper_weight -
+                                                    lower_weight)
+                return weight / total_weight
+
+        return 1.0
+
+    def quantile(self, quantile):
+        if self.count == 0:
+            return None
+
+        points = self.__cdf_points()
+        target_weight = min(max(quantile, 0), 1) * points[-1][1]
+        for (lower_value, lower_weight), (upper_value, upper_weight) in \
+                zip(points, points[1:]):
+            if lower_weight <= target_weight <= upper_weight:
+                if upper_weight == lower_weight:
+                    return lower_value
+                position = (target_weight - lower_weight) / \
+                           (upper_weight - lower_weight)
+                return lower_value + position * (upper_value - lower_value)
+
+        return self.maximum
+
+    def to_dict(self):
+        self.compress()
+        return {
+            "compression": self.compression,
+            "centroids": self.centroids,
+            "count": self.count,
+            "min": self.minimum,
+            "max": self.maximum,
+        }
+
+    @staticmethod
+    def from_dict(document):
+        return TDigest(document["compression"], document["centroids"],
+                       document["count"], document["min"], document["max"])
+
+
+class CountMinSketch:
+    def __init__(self, width=2048, depth=4, table=None, capacity=100,
+                 candidates=None):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else \
+            [[0] * width for _ in range(depth)]
+        self.capacity = capacity
+        self.candidates = candidates if candidates is not None else {}
+        self.__minimum_candidate_count = self.__candidates_minimum()
+
+    def __cells(self, hashes):
+        first_hash, second_hash = hashes
+        return [(row, (first_hash + row * second_hash) % self.width)
+                for row in range(self.depth)]
+
+    def __candidates_minimum(self):
+        if len(self.candidates) < self.capacity:
+            return 0
+        return min(self.candidates.values())
+
+    def estimate(self, hashes):
+        return min(self.table[row][column]
+                   for row, column in self.__cells(hashes))
+
+    def update(self, value, hashes):
+        estimate = None
+        for row, column in self.__cells(hashes):
+            self.table[row][column] += 1
+            cell_count = self.table[row][column]
+            if estimate is None or cell_count < estimate:
+                estimate = cell_count
+
+        if value in self.candidates:
+            self.candidates[value] = estimate
+        elif len(self.candidates) < self.capacity:
+            self.candidates[value] = estimate
+            self.__minimum_candidate_count = self.__candidates_minimum()
+        elif estimate > self.__minimum_candidate_count:
+            minimum_value = min(self.candidates, key=self.candidates.get)
+            del self.candidates[minimum_value]
+            self.candidates[value] = estimate
+            self.__minimum_candidate_count = self.__candidates_minimum()
+
+    def merge(self, other):
+        for row in range(self.depth):
+            for column in range(self.width):
+                self.table[row][column] += other.table[row][column]
+
+        merged_candidates = {
+            value: self.estimate(value_hash(value))
+            for value in list(self.candidates) + list(other.candidates)
+        }
+        self.candidates = dict(sorted(
+            merged_candidates.items(), key=lambda candidate: -candidate[1]
+        )[:self.capacity])
+        self.__minimum_candidate_count = self.__candidates_minimum()
+
+    def top(self, size):
+        return sorted(self.candidates.items(),
+                      key=lambda candidate: -candidate[1])[:size]
+
+    def to_dict(self):
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "table": self.table,
+            "capacity": self.capacity,
+            "candidates": [[value, count] for value, count in
+                           self.candidates.items()],
+        }
+
+    @staticmethod
+    def from_dict(document):
+        return CountMinSketch(
+            document["width"], document["depth"], document["table"],
+            document["capacity"],
+            {value: count for value, count in document["candidates"]})
+
+
+class HyperLogLog:
+    __HASH_BITS = 64
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.registers = registers if registers is not None else \
+            [0] * (1 << precision)
+
+    def update(self, hashes):
+        first_hash = hashes[0]
+        register_bits = self.__HASH_BITS - self.precision
+        register = first_hash >> register_bits
+        remaining_hash = first_hash & ((1 << register_bits) - 1)
+        rank = register_bits - remaining_hash.bit_length() + 1
+
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def merge(self, other):
+        self.registers = [max(register, other_register)
+                          for register, other_register in
+                          zip(self.registers, other.registers)]
+
+    def estimate(self):
+        registers_count = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / registers_count)
+        estimate = alpha * registers_count ** 2 / sum(
+            2.0 ** -register for register in self.registers)
+
+        empty_registers = self.registers.count(0)
+        if estimate <= 2.5 * registers_count and empty_registers > 0:
+            estimate = registers_count * math.log(
+                registers_count / empty_registers)
+
+        return int(round(estimate))
+
+    def to_dict(self):
+        return {
+            "precision": self.precision,
+            "registers": self.registers,
+        }
+
+    @staticmethod
+    def from_dict(document):
+        return HyperLogLog(document["precision"], document["registers"])
+
+
+class FieldSketch:
+    def __init__(self, count=0, null_count=0, digest=None,
+                 frequencies=None, cardinality=None):
+        self.count = count
+        self.null_count = null_count
+        self.digest = digest if digest is not None else TDigest()
+        self.frequencies = frequencies if frequencies is not None else \
+            CountMinSketch()
+        self.cardinality = cardinality if cardinality is not None else \
+            HyperLogLog()
+
+    def update(self, value):
+        self.count += 1
+
+        if value is None or value == "":
+            self.null_count += 1
+            return
+
+        if isinstance(value, int) and not isinstance(value, bool):
+            value = int(value)
+
+        if type(value) in [int, float] and math.isfinite(value):
+            self.digest.update(value)
+        elif type(value) in [list, dict]:
+            value = str(value)
+
+        hashes = value_hash(value)
+        self.frequencies.update(value, hashes)
+        self.cardinality.update(hashes)
+
+    def merge(self, other):
+        self.count += other.count
+        self.null_count += other.null_count
+        self.digest.merge(other.digest)
+        self.frequencies.merge(other.frequencies)
+        self.cardinality.merge(other.cardinality)
+
+    def histogram(self, bins, top, sample_scale=1):
+        def scaled(count):
+            return int(round(count * sample_scale))
+
+        result = {
+            "count": scaled(self.count),
+            "nullCount": scaled(self.null_count),
+            "sampledCount": self.count,
+            "distinctCount": self.cardinality.estimate(),
+            "topValues": [
+                {"_id": value, "count": scaled(count)}
+                for value, count in self.frequencies.top(top)
+            ],
+            "bins": [],
+        }
+
+        if self.digest.count == 0:
+            return result
+
+        minimum, maximum = self.digest.minimum, self.digest.maximum
+        width = (maximum - minimum) / bins or 1
+        previous_rank = 0
+        for bin_index in range(bins):
+            lower_bound = minimum + bin_index * width
+            upper_bound = lower_bound + width
+            if bin_index == bins - 1:
+                rank = self.digest.count
+            else:
+                rank = self.digest.cdf(upper_bound) * self.digest.count
+
+            result["bins"].append({
+                "_id": {"min": lower_bound, "max": upper_bound},
+                "count": scaled(rank - previous_rank),
+            })
+            previous_rank = rank
+
+        result["quantiles"] = [
+            {"quantile": quantile, "value": self.digest.quantile(quantile)}
+            for quantile in [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+        ]
+
+        return result
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "nullCount": self.null_count,
+            "digest": self.digest.to_dict(),
+            "frequencies": self.frequencies.to_dict(),
+            "cardinality": self.cardinality.to_dict(),
+        }
+
+    @staticmethod
+    def from_dict(document):
+        return FieldSketch(
+            document["count"], document["nullCount"],
+            TDigest.from_dict(document["digest"]),
+            CountMinSketch.from_dict(document["frequencies"]),
+            HyperLogLog.from_dict(document["cardinality"]))
+
+
+class Moments:
+    def __init__(self, count=0, mean=0.0, squared_deviations=0.0,
+                 minimum=None, maximum=None):
+        self.count = count
+        self.mean = mean
+        self.squared_deviations = squared_deviations
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.squared_deviations += delta * (value - self.mean)
+
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.squared_deviations += other.squared_deviations + \
+            delta ** 2 * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+
+        if self.minimum is None or other.minimum < self.minimum:
+            self.minimum = other.minimum
+        if self.maximum is None or other.maximum > self.maximum:
+            self.maximum = other.maximum
+
+    def variance(self):
+        if self.count < 2:
+            return None
+        return self.squared_deviations / (self.count - 1)
+
+
+class CoMoments:
+    def __init__(self):
+        self.count = 0
+        self.first_mean = 0.0
+        self.second_mean = 0.0
+        self.first_squared_deviations = 0.0
+        self.second_squared_deviations = 0.0
+        self.co_deviations = 0.0
+
+    def update(self, first_value, second_value):
+        self.count += 1
+        first_delta = first_value - self.first_mean
+        second_delta = second_value - self.second_mean
+        self.first_mean += first_delta / self.count
+        self.second_mean += second_delta / self.count
+        self.first_squared_deviations += first_delta * \
+            (first_value - self.first_mean)
+        self.second_squared_deviations += second_delta * \
+            (second_value - self.second_mean)
+        self.co_deviations += first_delta * (second_value - self.second_mean)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+
+        count = self.count + other.count
+        weight = self.count * other.count / count
+        first_delta = other.first_mean - self.first_mean
+        second_delta = other.second_mean - self.second_mean
+
+        self.first_squared_deviations += other.first_squared_deviations + \
+            first_delta ** 2 * weight
+        self.second_squared_deviations += \
+            other.second_squared_deviations + second_delta ** 2 * weight
+        self.co_deviations += other.co_deviations + \
+            first_delta * second_delta * weight
+        self.first_mean += first_delta * other.count / count
+        self.second_mean += second_delta * other.count / count
+        self.count = count
+
+    def correlation(self):
+        deviations_product = self.first_squared_deviations * \
+                             self.second_squared_deviations
+        if self.count < 2 or deviations_product <= 0:
+            return None
+        return self.co_deviations / math.sqrt(deviations_product)
@@ -1,5 +1,7 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne, DESCENDING
 from datetime import datetime
+import hashlib
+import json
 import pytz
 
 
@@ -9,13 +11,17 @@ class Metadata:
         self.METADATA_DOCUMENT_ID = 0
         self.DOCUMENT_ID_NAME = "_id"
 
-    def create_file(self, parent_filename, histogram_filename, fields):
+    def create_file(self, parent_filename, histogram_filename, fields, bins,
+                    approximate, sample_size):
         timezone_london = pytz.timezone("Etc/Greenwich")
         london_time = datetime.now(timezone_london)
 
         metadata_histogram_filename = {
             "parentDatasetName": parent_filename,
             "fields": fields,
+            "bins": bins,
+            "approximate": approximate,
+            "sampleSize": sample_size,
             "datasetName": histogram_filename,
             "type": "explore/histogram",
             self.DOCUMENT_ID_NAME: self.METADATA_DOCUMENT_ID,
@@ -27,6 +33,43 @@ class Metadata:
             histogram_filename, metadata_histogram_filename
         )
 
+    def create_describe_file(self, parent_filename, describe_filename,
+                             fields, correlation):
+        timezone_london = pytz.timezone("Etc/Greenwich")
+        london_time = datetime.now(timezone_london)
+
+        metadata_describe_filename = {
+            "parentDatasetName": parent_filename,
+            "fields": fields,
+            "correlation": correlation,
+            "datasetName": describe_filename,
+            "type": "explore/describe",
+            self.DOCUMENT_ID_NAME: self.METADATA_DOCUMENT_ID,
+            "finished": False,
+            "timeCreated": london_time.strftime("%Y-%m-%dT%H:%M:%S-00:00")
+        }
+
+        self.database_connector.insert_one_in_file(
+            describe_filename, metadata_describe_filename
+        )
+
+    def read_metadata(self, filename):
+        metadata_id_query = {
+            self.DOCUMENT_ID_NAME: self.METADATA_DOCUMENT_ID}
+        return self.database_connector.find_one(filename, metadata_id_query)
+
+    def update_dataset_version(self, histogram_filename, dataset_version):
+        metadata_dataset_version_query = {
+            "datasetVersion": dataset_version,
+            "lastDocumentId": dataset_version["lastDocumentId"],
+        }
+        metadata_id_query = {
+            self.DOCUMENT_ID_NAME: self.METADATA_DOCUMENT_ID}
+
+        self.database_connector.update_one(histogram_filename,
+                                           metadata_dataset_version_query,
+                                           metadata_id_query)
+
     def update_finish_flag(self, histogram_filename, flag):
         metadata_finished_true_query = {"finished": flag}
         metadata_id_query = {
@@ -37,24 +80,134 @@ class Metadata:
                                            metadata_id_query)
 
 
+class HistogramCache:
+    CACHE_FILENAME = "histogramCache"
+    CACHE_DATABASE_SUFFIX = "Cache"
+
+    def __init__(self, database, cache_database):
+        self.database_connector = database
+        self.cache_database_connector = cache_database
+        self.METADATA_DOCUMENT_ID = 0
+        self.DOCUMENT_ID_NAME = "_id"
+
+    def dataset_version(self, filename):
+        metadata_id_query = {
+            self.DOCUMENT_ID_NAME: self.METADATA_DOCUMENT_ID}
+        dataset_metadata = self.database_connector.find_one(
+            filename, metadata_id_query)
+        last_document = self.database_connector.find_one(
+            filename, {}, [(self.DOCUMENT_ID_NAME, DESCENDING)])
+
+        return {
+            "timeCreated": dataset_metadata.get("timeCreated"),
+            "version": dataset_metadata.get("version", 0),
+            "lastDocumentId": last_document[self.DOCUMENT_ID_NAME],
+        }
+
+    def fingerprint(self, parent_filename, dataset_version, field, mode):
+        fingerprint_content = json.dumps(
+            [parent_filename, dataset_version, field, mode],
+            sort_keys=True, default=str)
+        return hashlib.sha256(fingerprint_content.encode("utf-8")).hexdigest()
+
+    def read(self, parent_filename, dataset_version, fields_mode):
+        fingerprints = {
+            self.fingerprint(parent_filename, dataset_version, field, mode):
+                field
+            for field, mode in fields_mode.items()
+        }
+        cache_query = {self.DOCUMENT_ID_NAME: {"$in": list(fingerprints)}}
+
+        return {
+            fingerprints[cache_entry[self.DOCUMENT_ID_NAME]]:
+                cache_entry["document"]
+            for cache_entry in self.cache_database_connector.find(
+                self.CACHE_FILENAME, cache_query)
+        }
+
+    def save(self, parent_filename, dataset_version, fields_mode,
+             fields_document):
+        cache_entries = []
+        for field, mode in fields_mode.items():
+            cache_entries.append({
+                self.DOCUMENT_ID_NAME: self.fingerprint(
+                    parent_filename, dataset_version, field, mode),
+                "parentDatasetName": parent_filename,
+                "datasetVersion": dataset_version,
+                "field": field,
+                "mode": mode,
+                "document": fields_document[field],
+            })
+
+        self.cache_database_connector.upsert_many_in_file(
+            self.CACHE_FILENAME, cache_entries)
+
+    def invalidate(self, parent_filename, dataset_version):
+        stale_entries_query = {"$or": [
+            {"parentDatasetName": parent_filename,
+             "datasetVersion": {"$ne": dataset_version}},
+            {"parentDatasetName": {
+                "$nin": self.database_connector.get_filenames()}},
+        ]}
+        self.cache_database_connector.delete_many(self.CACHE_FILENAME,
+                                                  stale_entries_query)
+
+    def drop_legacy_cache(self):
+        metadata_id_query = {
+            self.DOCUMENT_ID_NAME: self.METADATA_DOCUMENT_ID}
+        filenames = self.database_connector.get_filenames()
+        if self.CACHE_FILENAME in filenames and \
+                self.database_connector.find_one(
+                    self.CACHE_FILENAME, metadata_id_query) is None:
+            self.database_connector.drop(self.CACHE_FILENAME)
+
+
 class Database:
     def __init__(self, database_url, replica_set, database_port, database_name):
         self.mongo_client = MongoClient(
             f'{database_url}/?replicaSet={replica_set}', int(database_port))
         self.database = self.mongo_client[database_name]
 
-    def find(self, filename, query):
+    def find(self, filename, query, projection=None):
+        file_collection = self.database[filename]
+        return file_collection.find(query, projection)
+
+    def sample(self, filename, size):
         file_collection = self.database[filename]
-        return file_collection.find(query)
+        pipeline = [{"$sample": {"size": size}}]
+        return file_collection.aggregate(pipeline, allowDiskUse=True)
 
     def aggregate(self, filename, pipeline):
         file_collection = self.database[filename]
-        return list(file_collection.aggregate(pipeline))
+        return list(file_collection.aggregate(pipeline, allowDiskUse=True))
+
+    def estimated_count(self, filename):
+        file_collection = self.database[filename]
+        return file_collection.estimated_document_count()
 
     def insert_one_in_file(self, filename, json_object):
         file_collection = self.database[filename]
         file_collection.insert_one(json_object)
 
+    def insert_many_in_file(self, filename, json_objects):
+        file_collection = self.database[filename]
+        file_collection.insert_many(json_objects)
+
+    def upsert_many_in_file(self, filename, json_objects):
+        file_collection = self.database[filename]
+        file_collection.bulk_write(
+            [ReplaceOne({"_id": json_object["_id"]}, json_object,
+                        upsert=True)
+             for json_object in json_objects],
+            ordered=False)
+
+    def delete_many(self, filename, query):
+        file_collection = self.database[filename]
+        file_collection.delete_many(query)
+
+    def drop(self, filename):
+        self.database.drop_collection(filename)
+
     def get_filenames(self):
         return self.database.list_collection_names()
 
@@ -63,9 +216,9 @@ class Database:
         file_collection = self.database[filename]
         file_collection.update_one(query, new_values_query)
 
-    def find_one(self, filename, query):
+    def find_one(self, filename, query, sort=None):
         file_collection = self.database[filename]
-        return file_collection.find_one(query)
+        return file_collection.find_one(query, sort=sort)
 
 
 class UserRequest:
@@ -74,6 +227,12 @@ class UserRequest:
     MESSAGE_MISSING_FIELDS = "missing fields"
     MESSAGE_UNFINISHED_PROCESSING = "unfinished processing in input dataset"
     MESSAGE_DUPLICATE_FILE = "duplicated dataset name"
+    MESSAGE_INVALID_BINS = "invalid bins"
+    MESSAGE_INVALID_APPROXIMATE = "invalid approximate options"
+    MESSAGE_NOT_APPROXIMATE = "histogram isn't approximate"
+    MESSAGE_INVALID_HISTOGRAM = "invalid histogram name"
+    MESSAGE_INVALID_CORRELATION = "invalid correlation option"
+    BIN_MODES = ["width", "count", "quantile"]
 
     def __init__(self, database_connector):
         self.database = database_connector
@@ -111,3 +270,68 @@ class UserRequest:
         for field in fields:
             if field not in filename_metadata["fields"]:
                 raise Exception(self.MESSAGE_INVALID_FIELDS)
+
+    def bins_validator(self, fields, bins):
+        if type(bins) != dict:
+            raise Exception(self.MESSAGE_INVALID_BINS)
+
+        for field, field_bins in bins.items():
+            if field not in fields or type(field_bins) != dict or \
+                    field_bins.get("mode") not in self.BIN_MODES:
+                raise Exception(self.MESSAGE_INVALID_BINS)
+
+            if field_bins["mode"] == "width":
+                width = field_bins.get("width")
+                if type(width) not in [int, float] or width <= 0:
+                    raise Exception(self.MESSAGE_INVALID_BINS)
+            else:
+                count = field_bins.get("count")
+                if type(count) != int or count < 1:
+                    raise Exception(self.MESSAGE_INVALID_BINS)
+
+    def approximate_validator(self, approximate, sample_size, bins):
+        if type(approximate) != bool:
+            raise Exception(self.MESSAGE_INVALID_APPROXIMATE)
+
+        if sample_size is not None and \
+                (not approximate or type(sample_size) != int or
+                 sample_size < 1):
+            raise Exception(self.MESSAGE_INVALID_APPROXIMATE)
+
+        if approximate and bins:
+            raise Exception(self.MESSAGE_INVALID_APPROXIMATE)
+
+    def correlation_validator(self, correlation):
+        if type(correlation) != bool:
+            raise Exception(self.MESSAGE_INVALID_CORRELATION)
+
+    def approximate_histogram_validator(self, histogram_filename):
+        self.filename_validator(histogram_filename)
+
+        filename_metadata_query = {"datasetName": histogram_filename}
+        filename_metadata = self.database.find_one(histogram_filename,
+                                                   filename_metadata_query)
+
+        if not filename_metadata.get("approximate"):
+            raise Exception(self.MESSAGE_NOT_APPROXIMATE)
+
+        if not filename_metadata["finished"]:
+            raise Exception(self.MESSAGE_UNFINISHED_PROCESSING)
+
+    def refresh_validator(self, histogram_filename):
+        self.filename_validator(histogram_filename)
+
+        filename_metadata_query = {"datasetName": histogram_filename}
+        filename_metadata = self.database.find_one(histogram_filename,
+                                                   filename_metadata_query)
+
+        if filename_metadata.get("type") != "explore/histogram" or \
+                "datasetVersion" not in filename_metadata:
+            raise Exception(self.MESSAGE_INVALID_HISTOGRAM)
+
+        if not filename_metadata["finished"]:
+            raise Exception(self.MESSAGE_UNFINISHED_PROCESSING)
+
+        parent_filename = filename_metadata["parentDatasetName"]
+        self.filename_validator(parent_filename)
+        self.finished_processing_validator(parent_filename)
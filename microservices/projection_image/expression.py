@@ -0,0 +1,293 @@
+from functools import reduce
+import operator
+from pyspark.sql import functions, Column
+
+
+class Expression:
+    MESSAGE_INVALID_EXPRESSION = "invalid expression"
+    NUMBER_TYPE = "number"
+    STRING_TYPE = "string"
+    BOOLEAN_TYPE = "boolean"
+    DATE_TYPE = "date"
+    NULL_TYPE = "null"
+    MIXED_TYPE = "mixed"
+    __FIELD_PREFIX = "$"
+    __LITERAL_OPERATOR = "$literal"
+    __VARIADIC = None
+    __OPERATORS_ARITY = {
+        "$eq": 2,
+        "$ne": 2,
+        "$gt": 2,
+        "$gte": 2,
+        "$lt": 2,
+        "$lte": 2,
+        "$and": __VARIADIC,
+        "$or": __VARIADIC,
+        "$not": 1,
+        "$add": __VARIADIC,
+        "$multiply": __VARIADIC,
+        "$subtract": 2,
+        "$divide": 2,
+        "$mod": 2,
+        "$abs": 1,
+        "$concat": __VARIADIC,
+        "$toLower": 1,
+        "$toUpper": 1,
+        "$cond": 3,
+        "$ifNull": 2,
+    }
+    __EQUALITY_OPERATORS = ["$eq", "$ne"]
+    __ORDERING_OPERATORS = ["$gt", "$gte", "$lt", "$lte"]
+    __LOGICAL_OPERATORS = ["$and", "$or", "$not"]
+    __ARITHMETIC_OPERATORS = ["$add", "$multiply", "$subtract", "$divide",
+                              "$mod", "$abs"]
+    __STRING_OPERATORS = ["$concat", "$toLower", "$toUpper"]
+    __DIVISION_OPERATORS = ["$divide", "$mod"]
+    __CASE_OPERATORS = ["$toLower", "$toUpper"]
+    __ORDERED_TYPES = [NUMBER_TYPE, STRING_TYPE, DATE_TYPE]
+    __BSON_TYPES = {
+        "double": NUMBER_TYPE,
+        "int": NUMBER_TYPE,
+        "long": NUMBER_TYPE,
+        "decimal": NUMBER_TYPE,
+        "string": STRING_TYPE,
+        "bool": BOOLEAN_TYPE,
+        "date": DATE_TYPE,
+    }
+    __BSON_NULL_TYPES = ["null", "missing"]
+    __SPARK_OPERATORS = {
+        "$eq": lambda first, second: first.eqNullSafe(second),
+        "$ne": lambda first, second: ~first.eqNullSafe(second),
+        "$gt": operator.gt,
+        "$gte": operator.ge,
+        "$lt": operator.lt,
+        "$lte": operator.le,
+        "$and": lambda *arguments: reduce(operator.and_, arguments),
+        "$or": lambda *arguments: reduce(operator.or_, arguments),
+        "$not": operator.invert,
+        "$add": lambda *arguments: reduce(operator.add, arguments),
+        "$multiply": lambda *arguments: reduce(operator.mul, arguments),
+        "$subtract": operator.sub,
+        "$divide": operator.truediv,
+        "$mod": operator.mod,
+        "$abs": functions.abs,
+        "$concat": functions.concat,
+        "$toLower": functions.lower,
+        "$toUpper": functions.upper,
+        "$cond": lambda condition, if_true, if_false:
+        functions.when(condition, if_true).otherwise(if_false),
+        "$ifNull": functions.coalesce,
+    }
+
+    def __init__(self, field_types: dict = None):
+        self.__field_types = field_types or {}
+
+    @classmethod
+    def field_type(cls, bson_types: list) -> str:
+        field_types = {
+            cls.__BSON_TYPES.get(bson_type, bson_type)
+            for bson_type in bson_types
+            if bson_type not in cls.__BSON_NULL_TYPES
+        }
+        if not field_types:
+            return None
+        if len(field_types) > 1:
+            return cls.MIXED_TYPE
+
+        return field_types.pop()
+
+    def validate(self, expression, expected_type: str = None) -> None:
+        expression_type = self.__expression_type(expression)
+        if expected_type is not None and \
+                not self.__is_compatible(expression_type, expected_type):
+            raise Exception(self.MESSAGE_INVALID_EXPRESSION)
+
+    def referenced_fields(self, expression) -> set:
+        if self.__is_field(expression):
+            return {expression[len(self.__FIELD_PREFIX):]}
+
+        if type(expression) != dict:
+            return set()
+
+        expression_operator, arguments = next(iter(expression.items()))
+        if expression_operator == self.__LITERAL_OPERATOR:
+            return set()
+
+        return set().union(*[self.referenced_fields(argument)
+                             for argument in arguments])
+
+    def to_mongo(self, expression):
+        if self.__is_field(expression):
+            return {"$ifNull": [expression, None]}
+
+        if self.__is_literal(expression):
+            return {self.__LITERAL_OPERATOR: expression}
+
+        expression_operator, arguments = next(iter(expression.items()))
+        if expression_operator == self.__LITERAL_OPERATOR:
+            return expression
+
+        arguments = [self.to_mongo(argument) for argument in arguments]
+        mongo_expression = {expression_operator: arguments}
+
+        if expression_operator in self.__ORDERING_OPERATORS:
+            return {"$cond": [
+                {"$or": [{"$eq": [argument, None]}
+                         for argument in arguments]},
+                False,
+                mongo_expression,
+            ]}
+
+        if expression_operator in self.__DIVISION_OPERATORS:
+            return {"$cond": [
+                {"$eq": [arguments[1], 0]},
+                None,
+                mongo_expression,
+            ]}
+
+        if expression_operator in self.__CASE_OPERATORS:
+            return {"$cond": [
+                {"$eq": [arguments[0], None]},
+                None,
+                mongo_expression,
+            ]}
+
+        return mongo_expression
+
+    def to_spark(self, expression) -> Column:
+        if self.__is_field(expression):
+            return functions.col(expression[len(self.__FIELD_PREFIX):])
+
+        if self.__is_literal(expression):
+            return functions.lit(expression)
+
+        expression_operator, arguments = next(iter(expression.items()))
+        if expression_operator == self.__LITERAL_OPERATOR:
+            return functions.lit(arguments)
+
+        arguments = [self.to_spark(argument) for argument in arguments]
+
+        if expression_operator in self.__LOGICAL_OPERATORS:
+            arguments = [self.__spark_truth(argument)
+                         for argument in arguments]
+        elif expression_operator == "$cond":
+            arguments[0] = self.__spark_truth(arguments[0])
+
+        spark_expression = self.__SPARK_OPERATORS[expression_operator](
+            *arguments)
+
+        if expression_operator in self.__ORDERING_OPERATORS:
+            return functions.when(
+                reduce(operator.or_,
+                       [argument.isNull() for argument in arguments]),
+                functions.lit(False)).otherwise(spark_expression)
+
+        return spark_expression
+
+    def __spark_truth(self, argument: Column) -> Column:
+        return functions.coalesce(argument, functions.lit(False))
+
+    def __expression_type(self, expression) -> str:
+        if self.__is_field(expression):
+            field = expression[len(self.__FIELD_PREFIX):]
+            if field not in self.__field_types:
+                raise Exception(self.MESSAGE_INVALID_EXPRESSION)
+            return self.__field_types[field]
+
+        if self.__is_literal(expression):
+            return self.__literal_type(expression)
+
+        if type(expression) != dict or len(expression) != 1:
+            raise Exception(self.MESSAGE_INVALID_EXPRESSION)
+
+        expression_operator, arguments = next(iter(expression.items()))
+        if expression_operator == self.__LITERAL_OPERATOR:
+            if not self.__is_literal(arguments) and type(arguments) != str:
+                raise Exception(self.MESSAGE_INVALID_EXPRESSION)
+            return self.__literal_type(arguments)
+
+        if expression_operator not in self.__OPERATORS_ARITY or \
+                type(arguments) != list or not arguments:
+            raise Exception(self.MESSAGE_INVALID_EXPRESSION)
+
+        arity = self.__OPERATORS_ARITY[expression_operator]
+        if arity is not self.__VARIADIC and len(arguments) != arity:
+            raise Exception(self.MESSAGE_INVALID_EXPRESSION)
+
+        arguments_type = [self.__expression_type(argument)
+                          for argument in arguments]
+
+        if expression_operator in self.__EQUALITY_OPERATORS:
+            self.__require_same_type(*arguments_type)
+            return self.BOOLEAN_TYPE
+
+        if expression_operator in self.__ORDERING_OPERATORS:
+            self.__require_same_type(*arguments_type)
+            for argument_type in arguments_type:
+                if not self.__is_unknown(argument_type) and \
+                        argument_type not in self.__ORDERED_TYPES:
+                    raise Exception(self.MESSAGE_INVALID_EXPRESSION)
+            return self.BOOLEAN_TYPE
+
+        if expression_operator in self.__LOGICAL_OPERATORS:
+            self.__require_types(arguments_type, self.BOOLEAN_TYPE)
+            return self.BOOLEAN_TYPE
+
+        if expression_operator in self.__ARITHMETIC_OPERATORS:
+            self.__require_types(arguments_type, self.NUMBER_TYPE)
+            return self.NUMBER_TYPE
+
+        if expression_operator in self.__STRING_OPERATORS:
+            self.__require_types(arguments_type, self.STRING_TYPE)
+            return self.STRING_TYPE
+
+        if expression_operator == "$cond":
+            condition_type, true_type, false_type = arguments_type
+            self.__require_types([condition_type], self.BOOLEAN_TYPE)
+            self.__require_same_type(true_type, false_type)
+            return false_type if self.__is_unknown(true_type) else true_type
+
+        first_type, second_type = arguments_type
+        self.__require_same_type(first_type, second_type)
+        return second_type if self.__is_unknown(first_type) else first_type
+
+    def __literal_type(self, literal) -> str:
+        if literal is None:
+            return self.NULL_TYPE
+        if type(literal) == bool:
+            return self.BOOLEAN_TYPE
+        if type(literal) in [int, float]:
+            return self.NUMBER_TYPE
+
+        return self.STRING_TYPE
+
+    def __is_unknown(self, expression_type: str) -> bool:
+        return expression_type is None or expression_type == self.NULL_TYPE
+
+    def __is_compatible(self, expression_type: str,
+                        expected_type: str) -> bool:
+        return self.__is_unknown(expression_type) or \
+            expression_type == expected_type
+
+    def __require_types(self, arguments_type: list,
+                        expected_type: str) -> None:
+        for argument_type in arguments_type:
+            if not self.__is_compatible(argument_type, expected_type):
+                raise Exception(self.MESSAGE_INVALID_EXPRESSION)
+
+    def __require_same_type(self, first_type: str, second_type: str) -> None:
+        if self.__is_unknown(first_type) or self.__is_unknown(second_type):
+            return
+
+        if first_type == self.MIXED_TYPE or first_type != second_type:
+            raise Exception(self.MESSAGE_INVALID_EXPRESSION)
+
+    def __is_field(self, expression) -> bool:
+        return type(expression) == str and \
+               expression.startswith(self.__FIELD_PREFIX)
+
+    def __is_literal(self, expression) -> bool:
+        return expression is None or \
+               type(expression) in [bool, int, float] or \
+               (type(expression) == str and
+                not expression.startswith(self.__FIELD_PREFIX))
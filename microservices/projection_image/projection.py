@@ -1,6 +1,13 @@
 import pyspark.sql.session
 from concurrent.futures import ThreadPoolExecutor
-from utils import Metadata
+import json
+import math
+import time
+from uuid import uuid4
+from utils import Metadata, Database
+from expression import Expression
+from instrumentation import Instrumentation
+from sizing import SizingPolicy
 
 
 class Projection:
@@ -10,39 +17,270 @@ class Projection:
     __METADATA_FILE_ID = 0
     __database_url_output = None
     __MAX_NUMBER_THREADS = 3
+    __SPARK_ENGINE = "spark"
+    __MONGO_ENGINE = "mongo"
+    __MONGO_ENGINE_MAX_DOCUMENTS = 200000
+    __MONGO_ENGINE_MAX_SIZE = 256 * 1024 * 1024
+    __TEMPORARY_FILENAME_SUFFIX = "_projection"
+    __PARTITIONS_PER_CORE = 2
+    __MIN_DOCUMENTS_PER_PARTITION = 10000
 
     def __init__(self, metadata_creator: Metadata,
+                 database_connector: Database,
                  spark_session: pyspark.sql.session.SparkSession):
         self.__metadata_creator = metadata_creator
+        self.__database_connector = database_connector
         self.__thread_pool = ThreadPoolExecutor()
         self.__spark_session = spark_session
+        self.__expression = Expression()
+        self.__instrumentation = Instrumentation(
+            spark_session.sparkContext)
+        self.__sizing_policy = SizingPolicy(spark_session.sparkContext,
+                                            "transform/projection")
 
     def create(self, parent_filename: str, projection_filename: str,
                fields: list, database_url_input: str,
-               database_url_output: str) -> None:
+               database_url_output: str, row_filter=None,
+               derived_fields: dict = None,
+               write_options: dict = None) -> None:
+        derived_fields = derived_fields or {}
+        write_options = write_options or {}
         self.__metadata_creator.create_file(
             projection_filename,
             parent_filename,
-            fields)
+            fields,
+            row_filter,
+            derived_fields)
 
-        self.__thread_pool.submit(self.__execute_spark_job,
-                                  projection_filename, fields,
-                                  database_url_input, database_url_output)
+        if self.__database_connector.is_view(parent_filename):
+            self.__thread_pool.submit(self.__execute_mongo_job,
+                                      parent_filename, projection_filename,
+                                      fields, row_filter, derived_fields)
+            return
+
+        statistics = self.__database_connector.collection_statistics(
+            parent_filename)
+        if self.__is_small_dataset(statistics):
+            self.__thread_pool.submit(self.__execute_mongo_job,
+                                      parent_filename, projection_filename,
+                                      fields, row_filter, derived_fields)
+        else:
+            spark_sizing = self.__sizing_policy.size(statistics["size"])
+            self.__metadata_creator.update_spark_sizing(projection_filename,
+                                                        spark_sizing)
+            self.__thread_pool.submit(self.__execute_spark_job,
+                                      projection_filename, fields,
+                                      database_url_input,
+                                      database_url_output, row_filter,
+                                      derived_fields, statistics["count"],
+                                      write_options, spark_sizing)
+
+    def create_view(self, parent_filename: str, projection_filename: str,
+                    fields: list, row_filter=None,
+                    derived_fields: dict = None) -> None:
+        derived_fields = derived_fields or {}
+        metadata = self.__metadata_creator.build_metadata(
+            projection_filename, parent_filename, fields, False, row_filter,
+            derived_fields)
+        metadata[self.__FINISHED] = True
+
+        is_metadata_document = {"$eq": [f'${self.__DOCUMENT_ID}',
+                                        self.__METADATA_FILE_ID]}
+        view_pipeline = []
+        if row_filter is not None:
+            view_pipeline.append({"$match": {"$expr": {"$or": [
+                is_metadata_document,
+                self.__expression.to_mongo(row_filter),
+            ]}}})
+
+        view_projection = {field: True for field in fields}
+        for derived_field, expression in derived_fields.items():
+            view_projection[derived_field] = {"$cond": [
+                is_metadata_document,
+                None,
+                self.__expression.to_mongo(expression),
+            ]}
+
+        view_pipeline += [
+            {"$project": view_projection},
+            {"$replaceRoot": {"newRoot": {"$cond": [
+                is_metadata_document,
+                {"$literal": metadata},
+                "$$ROOT",
+            ]}}},
+        ]
+        self.__database_connector.create_view(projection_filename,
+                                              parent_filename,
+                                              view_pipeline)
+
+    def materialize(self, projection_filename: str) -> None:
+        self.__thread_pool.submit(self.__materialize_view,
+                                  projection_filename)
+
+    def __materialize_view(self, projection_filename: str) -> None:
+        start_time = time.time()
+
+        metadata = self.__database_connector.find_one(
+            projection_filename,
+            {self.__DOCUMENT_ID: self.__METADATA_FILE_ID})
+        parent_filename = metadata["parentDatasetName"]
+        row_filter = metadata.get("filter")
+        if row_filter is not None:
+            row_filter = json.loads(row_filter)
+        derived_fields = {
+            derived_field: json.loads(expression)
+            for derived_field, expression in
+            metadata.get("derivedFields", {}).items()
+        }
+        fields = [field for field in metadata["fields"]
+                  if field not in derived_fields]
+
+        temporary_filename = self.__temporary_filename(projection_filename)
+        try:
+            self.__database_connector.aggregate(
+                parent_filename,
+                self.__read_pipeline(fields, row_filter, derived_fields) +
+                [{"$out": temporary_filename}])
+
+            metadata["materialized"] = True
+            self.__database_connector.insert_one_in_file(temporary_filename,
+                                                         metadata)
+        except Exception:
+            self.__database_connector.drop(temporary_filename)
+            raise
+
+        self.__database_connector.drop(projection_filename)
+        self.__database_connector.rename(temporary_filename,
+                                         projection_filename)
+
+        self.__metadata_creator.update_projection_statistics(
+            projection_filename, self.__MONGO_ENGINE,
+            time.time() - start_time, None,
+            self.__database_connector.collection_statistics(
+                projection_filename)["size"])
+
+    def __temporary_filename(self, projection_filename: str) -> str:
+        filenames = self.__database_connector.get_filenames()
+        while True:
+            temporary_filename = \
+                f'{projection_filename}{self.__TEMPORARY_FILENAME_SUFFIX}' \
+                f'_{uuid4().hex}'
+            if temporary_filename not in filenames:
+                return temporary_filename
+
+    def __is_small_dataset(self, statistics: dict) -> bool:
+        return statistics["count"] <= self.__MONGO_ENGINE_MAX_DOCUMENTS and \
+            statistics["size"] <= self.__MONGO_ENGINE_MAX_SIZE
+
+    def __execute_mongo_job(self, parent_filename: str,
+                            projection_filename: str, fields: list,
+                            row_filter, derived_fields: dict) -> None:
+        start_time = time.time()
+
+        temporary_filename = self.__temporary_filename(projection_filename)
+        try:
+            self.__database_connector.aggregate(
+                parent_filename,
+                self.__read_pipeline(fields, row_filter, derived_fields) +
+                [{"$out": temporary_filename}])
+
+            metadata = self.__database_connector.find_one(
+                projection_filename,
+                {self.__DOCUMENT_ID: self.__METADATA_FILE_ID})
+            self.__database_connector.insert_one_in_file(temporary_filename,
+                                                         metadata)
+            self.__database_connector.rename(temporary_filename,
+                                             projection_filename)
+        except Exception:
+            self.__database_connector.drop(temporary_filename)
+            raise
+
+        self.__metadata_creator.update_projection_statistics(
+            projection_filename, self.__MONGO_ENGINE,
+            time.time() - start_time, None,
+            self.__database_connector.collection_statistics(
+                projection_filename)["size"])
+        self.__metadata_creator.update_finished_flag(projection_filename, True)
 
     def __execute_spark_job(self, projection_filename: str, fields: list,
                             database_url_input: str,
-                            database_url_output: str) -> None:
-        dataframe = self.__spark_session.read.format(
-            self.__MONGO_SPARK_SOURCE).option(
-            "spark.mongodb.input.uri", database_url_input).load()
-        dataframe = dataframe.filter(
-            dataframe[self.__DOCUMENT_ID] != self.__METADATA_FILE_ID
-        )
-
-        fields.append(self.__DOCUMENT_ID)
-        projection_dataframe = dataframe.select(*fields)
-        projection_dataframe.write.format(
-            self.__MONGO_SPARK_SOURCE).mode("append").option(
-            "spark.mongodb.output.uri", database_url_output).save()
+                            database_url_output: str, row_filter,
+                            derived_fields: dict, documents_count: int,
+                            write_options: dict, spark_sizing: dict) -> None:
+        with self.__instrumentation.job(
+                projection_filename, "transform/projection",
+                self.__sizing_policy.local_properties(spark_sizing)):
+            start_time = time.time()
+
+            read_fields = set(fields)
+            for expression in derived_fields.values():
+                read_fields.update(
+                    self.__expression.referenced_fields(expression))
+
+            dataframe = self.__spark_session.read.format(
+                self.__MONGO_SPARK_SOURCE).option(
+                "spark.mongodb.input.uri", database_url_input).option(
+                "pipeline",
+                json.dumps(self.__read_pipeline(sorted(read_fields),
+                                                row_filter))).load()
+
+            projection_dataframe = dataframe.select(
+                *fields,
+                *[self.__expression.to_spark(expression).alias(derived_field)
+                  for derived_field, expression in derived_fields.items()],
+                self.__DOCUMENT_ID)
 
+            spark_sizing = self.__sizing_policy.observed(spark_sizing)
+            partitions = self.__write_partitions(documents_count,
+                                                 spark_sizing["parallelism"])
+            projection_dataframe = projection_dataframe.repartition(partitions)
+
+            dataframe_writer = projection_dataframe.write.format(
+                self.__MONGO_SPARK_SOURCE).mode("append").option(
+                "spark.mongodb.output.uri", database_url_output)
+            for option_name, option_value in write_options.items():
+                dataframe_writer = dataframe_writer.option(option_name,
+                                                           option_value)
+            dataframe_writer.save()
+
+        projection_time = time.time() - start_time
+        spark_stages = self.__instrumentation.stages(projection_filename)
+        spark_summary = Instrumentation.summary(spark_stages)
+        self.__metadata_creator.update_projection_statistics(
+            projection_filename, self.__SPARK_ENGINE, projection_time,
+            spark_summary["inputBytes"],
+            self.__database_connector.collection_statistics(
+                projection_filename)["size"])
+        self.__metadata_creator.update_spark_sizing(projection_filename,
+                                                    spark_sizing)
+        self.__metadata_creator.update_write_statistics(
+            projection_filename, partitions, write_options,
+            self.__instrumentation.partition_times(projection_filename))
+        self.__metadata_creator.update_spark_statistics(
+            projection_filename, spark_stages, spark_summary)
         self.__metadata_creator.update_finished_flag(projection_filename, True)
+
+    def __write_partitions(self, documents_count: int,
+                           parallelism: int) -> int:
+        partitions = min(
+            parallelism * self.__PARTITIONS_PER_CORE,
+            math.ceil(documents_count / self.__MIN_DOCUMENTS_PER_PARTITION))
+
+        return max(partitions, 1)
+
+    def __read_pipeline(self, fields: list, row_filter=None,
+                        derived_fields: dict = None) -> list:
+        documents_filter = {
+            self.__DOCUMENT_ID: {"$ne": self.__METADATA_FILE_ID}}
+        if row_filter is not None:
+            documents_filter["$expr"] = self.__expression.to_mongo(row_filter)
+
+        documents_projection = {field: True for field in fields}
+        for derived_field, expression in (derived_fields or {}).items():
+            documents_projection[derived_field] = \
+                self.__expression.to_mongo(expression)
+
+        return [
+            {"$match": documents_filter},
+            {"$project": documents_projection},
+        ]
@@ -7,8 +7,10 @@ from pyspark.sql import SparkSession
 SPARKMASTER_HOST = "SPARKMASTER_HOST"
 SPARKMASTER_PORT = "SPARKMASTER_PORT"
 SPARK_DRIVER_PORT = "SPARK_DRIVER_PORT"
+SPARK_MAX_EXECUTORS = "SPARK_MAX_EXECUTORS"
 PROJECTION_HOST_NAME = "PROJECTION_HOST_NAME"
 
+HTTP_STATUS_CODE_SUCCESS = 200
 HTTP_STATUS_CODE_SUCCESS_CREATED = 201
 HTTP_STATUS_CODE_CONFLICT = 409
 HTTP_STATUS_CODE_NOT_ACCEPTABLE = 406
@@ -28,6 +30,11 @@ MESSAGE_RESULT = "result"
 PROJECTION_FILENAME_NAME = "outputDatasetName"
 PARENT_FILENAME_NAME = "inputDatasetName"
 FIELDS_NAME = "names"
+MATERIALIZE_NAME = "materialize"
+FILTER_NAME = "filter"
+DERIVED_FIELDS_NAME = "derivedFields"
+MAX_BATCH_SIZE_NAME = "maxBatchSize"
+ORDERED_NAME = "ordered"
 
 MICROSERVICE_URI_GET = "/api/learningOrchestra/v1/transform/projection/"
 MICROSERVICE_URI_GET_PARAMS = "?query={}&limit=20&skip=0"
@@ -55,9 +62,15 @@ spark_session = SparkSession.builder. \
     config("spark.jars.packages",
            "org.mongodb.spark:mongo-spark-connector_2.11:2.4.2",
            ). \
-    config("spark.cores.max", 3). \
+    config("spark.cores.max", os.environ[SPARK_MAX_EXECUTORS]). \
     config("spark.executor.cores", 1). \
     config("spark.executor.memory", "512m"). \
+    config("spark.dynamicAllocation.enabled", "true"). \
+    config("spark.dynamicAllocation.minExecutors", 0). \
+    config("spark.dynamicAllocation.maxExecutors",
+           os.environ[SPARK_MAX_EXECUTORS]). \
+    config("spark.dynamicAllocation.executorIdleTimeout", "60s"). \
+    config("spark.shuffle.service.enabled", "true"). \
     config("spark.scheduler.mode", "FAIR"). \
     config("spark.scheduler.pool", "transform/projection"). \
     config("spark.scheduler.allocation.file",
@@ -74,16 +87,43 @@ def create_projection():
     parent_filename = request.json[PARENT_FILENAME_NAME]
     projection_filename = request.json[PROJECTION_FILENAME_NAME]
     projection_fields = request.json[FIELDS_NAME]
+    materialize = request.json.get(MATERIALIZE_NAME, True)
+    row_filter = request.json.get(FILTER_NAME)
+    derived_fields = request.json.get(DERIVED_FIELDS_NAME, {})
+    write_options = {
+        option_name: request.json[option_name]
+        for option_name in [MAX_BATCH_SIZE_NAME, ORDERED_NAME]
+        if option_name in request.json
+    }
 
     request_errors = analyse_request_errors(
         request_validator,
         parent_filename,
         projection_filename,
-        projection_fields)
+        projection_fields,
+        materialize,
+        row_filter,
+        derived_fields,
+        write_options)
 
     if request_errors is not None:
         return request_errors
 
+    projection = Projection(metadata_creator, database, spark_session)
+
+    if not materialize:
+        projection.create_view(
+            parent_filename, projection_filename, projection_fields,
+            row_filter, derived_fields)
+
+        return (
+            jsonify({
+                MESSAGE_RESULT:
+                    f'{MICROSERVICE_URI_GET}{projection_filename}'
+                    f'{MICROSERVICE_URI_GET_PARAMS}'}),
+            HTTP_STATUS_CODE_SUCCESS_CREATED,
+        )
+
     database_url_input = Database.collection_database_url(
         database_url,
         database_name,
@@ -98,10 +138,10 @@ def create_projection():
         database_replica_set,
     )
 
-    projection = Projection(metadata_creator, spark_session)
     projection.create(
         parent_filename, projection_filename,
-        projection_fields, database_url_input, database_url_output)
+        projection_fields, database_url_input, database_url_output,
+        row_filter, derived_fields, write_options)
 
     return (
         jsonify({
@@ -112,8 +152,35 @@ def create_projection():
     )
 
 
+@app.route("/projections", methods=["PATCH"])
+def materialize_projection():
+    projection_filename = request.json[PROJECTION_FILENAME_NAME]
+
+    try:
+        request_validator.filename_validator(projection_filename)
+        request_validator.view_validator(projection_filename)
+    except Exception as invalid_projection:
+        return (
+            jsonify({MESSAGE_RESULT: invalid_projection.args[
+                FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
+    projection = Projection(metadata_creator, database, spark_session)
+    projection.materialize(projection_filename)
+
+    return (
+        jsonify({
+            MESSAGE_RESULT:
+                f'{MICROSERVICE_URI_GET}{projection_filename}'
+                f'{MICROSERVICE_URI_GET_PARAMS}'}),
+        HTTP_STATUS_CODE_SUCCESS,
+    )
+
+
 def analyse_request_errors(request_validator, parent_filename,
-                           projection_filename, fields_name):
+                           projection_filename, fields_name, materialize,
+                           row_filter, derived_fields, write_options):
     try:
         request_validator.projection_filename_validator(
             projection_filename
@@ -143,6 +210,34 @@ def analyse_request_errors(request_validator, parent_filename,
             HTTP_STATUS_CODE_NOT_ACCEPTABLE,
         )
 
+    try:
+        request_validator.expressions_validator(
+            parent_filename, fields_name, row_filter, derived_fields)
+    except Exception as invalid_expression:
+        return (
+            jsonify({MESSAGE_RESULT: invalid_expression.args[
+                FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
+    try:
+        request_validator.write_options_validator(write_options)
+    except Exception as invalid_write_options:
+        return (
+            jsonify({MESSAGE_RESULT: invalid_write_options.args[
+                FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
+    try:
+        request_validator.materialize_validator(materialize)
+    except Exception as invalid_materialize:
+        return (
+            jsonify({MESSAGE_RESULT: invalid_materialize.args[
+                FIRST_ARGUMENT]}),
+            HTTP_STATUS_CODE_NOT_ACCEPTABLE,
+        )
+
     try:
         request_validator.finished_processing_validator(
             parent_filename)
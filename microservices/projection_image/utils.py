@@ -1,6 +1,8 @@
 from datetime import datetime
+import json
 import pytz
 from pymongo import MongoClient
+from expression import Expression
 
 
 class Metadata:
@@ -13,7 +15,22 @@ class Metadata:
             "finished": False,
         }
 
-    def create_file(self, projection_filename, parent_filename, fields):
+    def create_file(self, projection_filename, parent_filename, fields,
+                    row_filter=None, derived_fields=None):
+        metadata = self.build_metadata(projection_filename, parent_filename,
+                                       fields, True, row_filter,
+                                       derived_fields)
+
+        self.database_connector.insert_one_in_file(
+            projection_filename,
+            metadata)
+
+        return metadata
+
+    def build_metadata(self, projection_filename, parent_filename, fields,
+                       materialized, row_filter=None, derived_fields=None):
+        derived_fields = derived_fields or {}
+
         london_time = datetime.now(self.timezone_london)
         now_time = london_time.strftime("%Y-%m-%dT%H:%M:%S-00:00")
 
@@ -21,14 +38,61 @@ class Metadata:
         metadata["timeCreated"] = now_time
         metadata["datasetName"] = projection_filename
         metadata["parentDatasetName"] = parent_filename
-        metadata["fields"] = fields
-
-        self.database_connector.insert_one_in_file(
-            projection_filename,
-            metadata)
+        metadata["fields"] = fields + list(derived_fields)
+        metadata["materialized"] = materialized
+        metadata["filter"] = json.dumps(row_filter) \
+            if row_filter is not None else None
+        metadata["derivedFields"] = {
+            derived_field: json.dumps(expression)
+            for derived_field, expression in derived_fields.items()
+        }
 
         return metadata
 
+    def update_projection_statistics(self, filename, projection_engine,
+                                     projection_time, read_bytes,
+                                     written_bytes):
+        projection_statistics_query = {
+            "projectionEngine": projection_engine,
+            "projectionTime": projection_time,
+            "projectionReadBytes": read_bytes,
+            "projectionWrittenBytes": written_bytes,
+        }
+        metadata_file_query = {"_id": 0}
+        self.database_connector.update_one(filename,
+                                           projection_statistics_query,
+                                           metadata_file_query)
+
+    def update_write_statistics(self, filename, partitions, write_options,
+                                partition_times):
+        write_statistics_query = {
+            "writePartitions": partitions,
+            "writeOptions": write_options,
+            "writePartitionTimes": partition_times,
+        }
+        metadata_file_query = {"_id": 0}
+        self.database_connector.update_one(filename,
+                                           write_statistics_query,
+                                           metadata_file_query)
+
+    def update_spark_statistics(self, filename, spark_stages,
+                                spark_summary):
+        spark_statistics_query = {
+            "sparkStages": spark_stages,
+            "sparkSummary": spark_summary,
+        }
+        metadata_file_query = {"_id": 0}
+        self.database_connector.update_one(filename,
+                                           spark_statistics_query,
+                                           metadata_file_query)
+
+    def update_spark_sizing(self, filename, spark_sizing):
+        spark_sizing_query = {"sparkSizing": spark_sizing}
+        metadata_file_query = {"_id": 0}
+        self.database_connector.update_one(filename,
+                                           spark_sizing_query,
+                                           metadata_file_query)
+
     def update_finished_flag(self, filename, flag):
         flag_true_query = {"finished": flag}
         metadata_file_query = {"_id": 0}
@@ -51,6 +115,46 @@ class Database:
         file_collection = self.database[filename]
         file_collection.insert_one(json_object)
 
+    def aggregate(self, filename, pipeline):
+        file_collection = self.database[filename]
+        return list(file_collection.aggregate(pipeline, allowDiskUse=True))
+
+    def create_view(self, filename, parent_filename, pipeline):
+        self.database.command("create", filename, viewOn=parent_filename,
+                              pipeline=pipeline)
+
+    def is_view(self, filename):
+        view_filter = {"name": filename, "type": "view"}
+        return any(True for _ in self.database.list_collections(
+            filter=view_filter))
+
+    def drop(self, filename):
+        self.database.drop_collection(filename)
+
+    def rename(self, filename, new_filename):
+        file_collection = self.database[filename]
+        file_collection.rename(new_filename, dropTarget=True)
+
+    def collection_statistics(self, filename):
+        return self.database.command("collstats", filename)
+
+    def field_types(self, filename, fields, sample_size):
+        fields_type = {
+            f'field{index}': {"$addToSet": {"$type": f'${field}'}}
+            for index, field in enumerate(fields)
+        }
+        pipeline = [
+            {"$match": {"_id": {"$ne": 0}}},
+            {"$sample": {"size": sample_size}},
+            {"$group": {"_id": None, **fields_type}},
+        ]
+        types_result = list(self.database[filename].aggregate(pipeline))
+
+        return {
+            field: types_result[0][f'field{index}'] if types_result else []
+            for index, field in enumerate(fields)
+        }
+
     def get_filenames(self):
         return self.database.list_collection_names()
 
@@ -75,6 +179,11 @@ class UserRequest:
     MESSAGE_DUPLICATE_FILE = "duplicated projection name"
     MESSAGE_MISSING_FIELDS = "missing fields"
     MESSAGE_UNFINISHED_PROCESSING = "unfinished processing in input dataset"
+    MESSAGE_INVALID_MATERIALIZE = "invalid materialize option"
+    MESSAGE_INVALID_DERIVED_FIELDS = "invalid derived fields"
+    MESSAGE_INVALID_WRITE_OPTIONS = "invalid write options"
+    MESSAGE_NOT_VIEW = "projection is already materialized"
+    FIELD_TYPES_SAMPLE_SIZE = 1000
 
     def __init__(self, database_connector):
         self.database = database_connector
@@ -112,3 +221,55 @@ class UserRequest:
         for field in projection_fields:
             if field not in filename_metadata["fields"]:
                 raise Exception(self.MESSAGE_INVALID_FIELDS)
+
+    def expressions_validator(self, filename, projection_fields, row_filter,
+                              derived_fields):
+        filename_metadata_query = {"datasetName": filename}
+
+        filename_metadata = self.database.find_one(filename,
+                                                   filename_metadata_query)
+        field_types = self.database.field_types(
+            filename, filename_metadata["fields"],
+            self.FIELD_TYPES_SAMPLE_SIZE)
+        expression = Expression({
+            field: Expression.field_type(bson_types)
+            for field, bson_types in field_types.items()
+        })
+
+        if row_filter is not None:
+            expression.validate(row_filter, Expression.BOOLEAN_TYPE)
+
+        if type(derived_fields) != dict:
+            raise Exception(self.MESSAGE_INVALID_DERIVED_FIELDS)
+
+        for derived_field, derived_expression in derived_fields.items():
+            if not derived_field or derived_field.startswith("$") or \
+                    "." in derived_field or derived_field == "_id" or \
+                    derived_field in projection_fields:
+                raise Exception(self.MESSAGE_INVALID_DERIVED_FIELDS)
+
+            expression.validate(derived_expression)
+
+    def write_options_validator(self, write_options):
+        max_batch_size = write_options.get("maxBatchSize")
+        if max_batch_size is not None and \
+                (type(max_batch_size) != int or max_batch_size < 1):
+            raise Exception(self.MESSAGE_INVALID_WRITE_OPTIONS)
+
+        ordered = write_options.get("ordered")
+        if ordered is not None and type(ordered) != bool:
+            raise Exception(self.MESSAGE_INVALID_WRITE_OPTIONS)
+
+    def materialize_validator(self, materialize):
+        if type(materialize) != bool:
+            raise Exception(self.MESSAGE_INVALID_MATERIALIZE)
+
+    def view_validator(self, projection_filename):
+        filename_metadata_query = {"datasetName": projection_filename}
+
+        filename_metadata = self.database.find_one(projection_filename,
+                                                   filename_metadata_query)
+
+        if filename_metadata.get("type") != "transform/projection" or \
+                filename_metadata.get("materialized", True):
+            raise Exception(self.MESSAGE_NOT_VIEW)
@@ -0,0 +1,157 @@
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.error import URLError
+from urllib.request import urlopen
+import json
+import pyspark
+
+
+class Instrumentation:
+    __REST_API = "/api/v1"
+    __REST_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fGMT"
+    __SKEW_QUANTILES = [0.5, 1.0]
+    __JOB_GROUP_PROPERTIES = ["spark.jobGroup.id", "spark.job.description",
+                              "spark.job.interruptOnCancel"]
+
+    def __init__(self, spark_context: pyspark.SparkContext):
+        self.__spark_context = spark_context
+
+    @contextmanager
+    def job(self, job_group: str, description: str,
+            local_properties: dict = None):
+        local_properties = local_properties or {}
+        self.__spark_context.setJobGroup(job_group, description)
+        for property_name, property_value in local_properties.items():
+            self.__spark_context.setLocalProperty(property_name,
+                                                  property_value)
+        try:
+            yield
+        finally:
+            for property_name in [*self.__JOB_GROUP_PROPERTIES,
+                                  *local_properties]:
+                self.__spark_context.setLocalProperty(property_name, None)
+
+    def stages(self, job_group: str) -> list:
+        status_tracker = self.__spark_context.statusTracker()
+        stage_ids = set()
+        for job_id in status_tracker.getJobIdsForGroup(job_group):
+            job_info = status_tracker.getJobInfo(job_id)
+            if job_info is not None:
+                stage_ids.update(job_info.stageIds)
+
+        stages = []
+        for stage_id in sorted(stage_ids):
+            stage_attempts = self.__rest_request(f'/stages/{stage_id}')
+            if not stage_attempts:
+                continue
+
+            stage_data = stage_attempts[0]
+            if stage_data.get("status") != "COMPLETE":
+                continue
+
+            stages.append({
+                "stageId": stage_id,
+                "name": stage_data.get("name"),
+                "tasks": stage_data.get("numCompleteTasks"),
+                "duration": self.__stage_duration(stage_data),
+                "executorRunTime": stage_data.get("executorRunTime"),
+                "inputBytes": stage_data.get("inputBytes"),
+                "outputBytes": stage_data.get("outputBytes"),
+                "shuffleReadBytes": stage_data.get("shuffleReadBytes"),
+                "shuffleWriteBytes": stage_data.get("shuffleWriteBytes"),
+                "memoryBytesSpilled": stage_data.get("memoryBytesSpilled"),
+                "diskBytesSpilled": stage_data.get("diskBytesSpilled"),
+                "taskSkew": self.__task_skew(stage_id,
+                                             stage_data.get("attemptId", 0)),
+            })
+
+        return stages
+
+    def partition_times(self, job_group: str) -> list:
+        status_tracker = self.__spark_context.statusTracker()
+        job_ids = status_tracker.getJobIdsForGroup(job_group)
+        if not job_ids:
+            return []
+
+        job_info = status_tracker.getJobInfo(max(job_ids))
+        if job_info is None or not job_info.stageIds:
+            return []
+
+        result_stage_id = max(job_info.stageIds)
+        stage_info = status_tracker.getStageInfo(result_stage_id)
+        if stage_info is None:
+            return []
+
+        tasks = self.__rest_request(
+            f'/stages/{result_stage_id}/{stage_info.currentAttemptId}'
+            f'/taskList?length={stage_info.numTasks}') or []
+
+        return sorted(
+            [{"partition": task["index"],
+              "executorId": task.get("executorId"),
+              "duration": task.get("duration")}
+             for task in tasks],
+            key=lambda partition_time: partition_time["partition"])
+
+    @staticmethod
+    def summary(stages: list) -> dict:
+        def total(metric_name):
+            return sum(stage[metric_name] or 0 for stage in stages)
+
+        task_skews = [stage["taskSkew"] for stage in stages
+                      if stage["taskSkew"] is not None]
+
+        return {
+            "stages": len(stages),
+            "duration": total("duration"),
+            "executorRunTime": total("executorRunTime"),
+            "inputBytes": total("inputBytes"),
+            "outputBytes": total("outputBytes"),
+            "shuffleReadBytes": total("shuffleReadBytes"),
+            "shuffleWriteBytes": total("shuffleWriteBytes"),
+            "spilledBytes": total("memoryBytesSpilled") +
+                            total("diskBytesSpilled"),
+            "maxTaskSkew": max(task_skews) if task_skews else None,
+        }
+
+    def __task_skew(self, stage_id: int, attempt_id: int) -> float:
+        quantiles = ",".join(str(quantile)
+                             for quantile in self.__SKEW_QUANTILES)
+        task_summary = self.__rest_request(
+            f'/stages/{stage_id}/{attempt_id}/taskSummary'
+            f'?quantiles={quantiles}')
+        if not task_summary:
+            return None
+
+        median_run_time, max_run_time = task_summary["executorRunTime"]
+        if not median_run_time:
+            return None
+
+        return max_run_time / median_run_time
+
+    def __stage_duration(self, stage_data: dict) -> int:
+        if not stage_data.get("submissionTime") or \
+                not stage_data.get("completionTime"):
+            return None
+
+        submission_time = datetime.strptime(stage_data["submissionTime"],
+                                            self.__REST_TIME_FORMAT)
+        completion_time = datetime.strptime(stage_data["completionTime"],
+                                            self.__REST_TIME_FORMAT)
+
+        return int((completion_time - submission_time).total_seconds() *
+                   1000)
+
+    def __rest_request(self, application_path: str):
+        if self.__spark_context.uiWebUrl is None:
+            return None
+
+        request_url = \
+            f'{self.__spark_context.uiWebUrl}{self.__REST_API}' \
+            f'/applications/{self.__spark_context.applicationId}' \
+            f'{application_path}'
+        try:
+            with urlopen(request_url) as response:
+                return json.loads(response.read())
+        except (URLError, ValueError):
+            return None
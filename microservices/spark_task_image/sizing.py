@@ -0,0 +1,49 @@
+from py4j.protocol import Py4JError
+import pyspark
+
+
+class SizingPolicy:
+    SMALL_POOL = "small"
+    MEDIUM_POOL = "medium"
+    LARGE_POOL = "large"
+    __POOL_PROPERTY = "spark.scheduler.pool"
+    __SMALL_MAX_SIZE = 64 * 1024 ** 2
+    __MEDIUM_MAX_SIZE = 1024 ** 3
+
+    def __init__(self, spark_context: pyspark.SparkContext,
+                 pool_prefix: str):
+        self.__spark_context = spark_context
+        self.__pool_prefix = pool_prefix
+
+    def size(self, input_size: int) -> dict:
+        if input_size <= self.__SMALL_MAX_SIZE:
+            pool = self.SMALL_POOL
+        elif input_size <= self.__MEDIUM_MAX_SIZE:
+            pool = self.MEDIUM_POOL
+        else:
+            pool = self.LARGE_POOL
+
+        return {
+            "pool": f'{self.__pool_prefix}/{pool}',
+            "inputSize": input_size,
+        }
+
+    def local_properties(self, sizing: dict) -> dict:
+        return {self.__POOL_PROPERTY: sizing["pool"]}
+
+    def observed(self, sizing: dict) -> dict:
+        return {
+            **sizing,
+            "executors": self.__executors(),
+            "parallelism": self.__spark_context.defaultParallelism,
+        }
+
+    def __executors(self) -> int:
+        try:
+            executor_infos = self.__spark_context._jsc.sc().statusTracker() \
+                .getExecutorInfos()
+        except Py4JError:
+            return None
+
+        # The status tracker lists the driver among the executors.
+        return max(len(executor_infos) - 1, 0)